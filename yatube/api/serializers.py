@@ -0,0 +1,58 @@
+def post_image(post):
+    return post.image.url if post.image else None
+
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date.isoformat(),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': post_image,
+}
+
+GROUP_FIELDS = {
+    'id': lambda group: group.pk,
+    'title': lambda group: group.title,
+    'slug': lambda group: group.slug,
+    'description': lambda group: group.description,
+}
+
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'post': lambda comment: comment.post_id,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created.isoformat(),
+}
+
+PROFILE_FIELDS = {
+    'id': lambda user: user.pk,
+    'username': lambda user: user.username,
+    'full_name': lambda user: user.get_full_name(),
+    'posts_count': lambda user: user.stats.posts_count,
+    'followers_count': lambda user: user.stats.followers_count,
+    'following_count': lambda user: user.stats.following_count,
+}
+
+# Связи, которые нужно подтянуть select_related для полей сериализатора.
+RELATED = {
+    'author': 'author',
+    'group': 'group',
+}
+
+
+def requested_fields(request, available):
+    """Поля из ``?fields=a,b``; неизвестные отбрасываются."""
+    fields = request.GET.get('fields')
+    if not fields:
+        return list(available)
+    return [name for name in fields.split(',') if name in available]
+
+
+def related_for(fields):
+    return [RELATED[name] for name in fields if name in RELATED]
+
+
+def serialize(obj, fields, available):
+    return {name: available[name](obj) for name in fields}
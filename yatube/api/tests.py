@@ -0,0 +1,244 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.autocomplete import autocomplete
+from PIL import Image
+from posts.models import Comment, Follow, Group, Post, Upload, User
+
+TEMP_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Пост {i}'
+            )
+            for i in range(15)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий'
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.auth_client = Client()
+        self.auth_client.force_login(self.reader)
+        cache.clear()
+
+    def test_feed_is_paginated_by_cursor(self):
+        """Лента отдаётся страницами по курсору."""
+        first = self.guest_client.get(reverse('api:feed')).json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertIsNone(first['previous'])
+        second = self.guest_client.get(
+            reverse('api:feed'), {'before': first['next']}
+        ).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+
+    def test_sparse_fields(self):
+        """Параметр fields ограничивает набор полей."""
+        post = self.posts[0]
+        response = self.guest_client.get(
+            reverse('api:post_detail', kwargs={'post_id': post.pk}),
+            {'fields': 'id,text,unknown'},
+        )
+        self.assertEqual(response.json(), {'id': post.pk, 'text': post.text})
+
+    def test_batch_keeps_requested_order(self):
+        """Пакетный запрос возвращает посты в порядке ids."""
+        ids = [self.posts[3].pk, 0, self.posts[1].pk]
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(
+                reverse('api:post_batch'),
+                {'ids': ','.join(map(str, ids)), 'fields': 'id,author'},
+            )
+        self.assertEqual(
+            [post['id'] for post in response.json()['results']],
+            [self.posts[3].pk, self.posts[1].pk]
+        )
+
+    def test_comments_group_and_profile(self):
+        """Комментарии, группа и профиль сериализуются без шаблонов."""
+        comments = self.guest_client.get(reverse(
+            'api:post_comments', kwargs={'post_id': self.posts[0].pk}
+        )).json()
+        self.assertEqual(comments['results'][0]['author'], 'reader')
+        group = self.guest_client.get(reverse(
+            'api:group_detail', kwargs={'slug': self.group.slug}
+        )).json()
+        self.assertEqual(group['slug'], self.group.slug)
+        profile = self.guest_client.get(reverse(
+            'api:profile_detail', kwargs={'username': 'author'}
+        )).json()
+        self.assertEqual(profile['posts_count'], 15)
+
+    def test_follow_feed(self):
+        """Лента подписок доступна только авторизованному пользователю."""
+        url = reverse('api:follow_feed')
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        Follow.objects.create(user=self.reader, author=self.user)
+        results = self.auth_client.get(url).json()['results']
+        self.assertEqual(results[0]['id'], self.posts[-1].pk)
+
+    def test_missing_post_returns_json_404(self):
+        """Несуществующий пост отдаёт 404 в JSON."""
+        response = self.guest_client.get(
+            reverse('api:post_detail', kwargs={'post_id': 10 ** 6})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertIn('detail', response.json())
+
+    def test_autocomplete(self):
+        """Подсказки по префиксу для пользователей и групп."""
+        autocomplete.indexes = None
+        url = reverse('api:autocomplete')
+        response = self.guest_client.get(url, {'q': 'te'})
+        self.assertEqual(response.json()['results'], [
+            {'kind': 'group', 'name': 'test-slug', 'weight': 15},
+        ])
+        response = self.guest_client.get(url, {'q': 'RE', 'kind': 'user'})
+        self.assertEqual(
+            [result['name'] for result in response.json()['results']],
+            ['reader'],
+        )
+        response = self.guest_client.get(url, {'q': 'a', 'kind': 'post'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+@override_settings(
+    MEDIA_ROOT=os.path.join(TEMP_ROOT, 'media'),
+    CHUNKED_UPLOAD_DIR=os.path.join(TEMP_ROOT, 'chunks'),
+    CHUNKED_UPLOAD_CHUNK_SIZE=1024,
+    IMAGE_INGEST_WORKERS=0,
+    THUMBNAIL_WORKERS=0,
+)
+class UploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+        image = Image.effect_noise((64, 64), 50).convert('RGB')
+        output = BytesIO()
+        image.save(output, 'PNG')
+        cls.data = output.getvalue()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def start(self, data=None, **overrides):
+        data = self.data if data is None else data
+        response = self.client.post(
+            reverse('api:upload_start'),
+            {
+                'filename': 'noise.png', 'size': len(data),
+                'sha256': hashlib.sha256(data).hexdigest(), **overrides,
+            },
+            content_type='application/json',
+        )
+        return response
+
+    def send(self, token, offset, chunk):
+        return self.client.generic(
+            'PATCH', reverse('api:upload_detail', args=(token,)), chunk,
+            content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def upload(self):
+        token = self.start().json()['token']
+        for offset in range(0, len(self.data), 1024):
+            self.send(token, offset, self.data[offset:offset + 1024])
+        return token
+
+    def test_resumable_upload_is_used_by_post_form(self):
+        """Части принимаются по порядку, повтор части безопасен."""
+        response = self.start()
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        state = response.json()
+        token = state['token']
+        self.assertEqual((state['offset'], state['chunk_size']), (0, 1024))
+        self.send(token, 0, self.data[:1024])
+        response = self.send(token, 0, self.data[:1024])
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertEqual(response.json()['offset'], 1024)
+        response = self.client.get(
+            reverse('api:upload_detail', args=(token,))
+        )
+        self.assertEqual(response.json()['offset'], 1024)
+        for offset in range(1024, len(self.data), 1024):
+            response = self.send(
+                token, offset, self.data[offset:offset + 1024]
+            )
+        self.assertTrue(response.json()['complete'])
+        path = Upload.objects.get().path
+        self.assertTrue(os.path.exists(path))
+
+        self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Из частей', 'upload': token},
+        )
+        post = Post.objects.get(text='Из частей')
+        self.assertRegex(
+            post.image.name, r'^posts/\w\w/\w\w/[0-9a-f]{64}\.png$'
+        )
+        with Image.open(post.image) as image:
+            self.assertEqual((image.format, image.size), ('PNG', (64, 64)))
+        self.assertFalse(Upload.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_checksum_mismatch_restarts_upload(self):
+        token = self.start(sha256='0' * 64).json()['token']
+        for offset in range(0, len(self.data), 1024):
+            response = self.send(
+                token, offset, self.data[offset:offset + 1024]
+            )
+        self.assertEqual(response.status_code, HTTPStatus.UNPROCESSABLE_ENTITY)
+        self.assertEqual(response.json()['offset'], 0)
+        self.assertFalse(response.json()['complete'])
+
+    def test_invalid_requests(self):
+        """Нельзя пропустить часть, превысить размер или взять чужой токен."""
+        self.assertEqual(self.start(size=-1).status_code, 400)
+        with override_settings(IMAGE_MAX_BYTES=10):
+            self.assertEqual(self.start().status_code, 413)
+        token = self.start().json()['token']
+        self.assertEqual(self.send(token, 1024, b'x').status_code, 409)
+        self.assertEqual(self.send(token, 0, b'x' * 2048).status_code, 413)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Рано', 'upload': token}
+        )
+        self.assertFormError(
+            response, 'form', 'image', 'Загрузка не найдена или не завершена.'
+        )
+        other = Client()
+        other.force_login(User.objects.create_user(username='other'))
+        response = other.get(reverse('api:upload_detail', args=(token,)))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        response = Client().post(reverse('api:upload_start'))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
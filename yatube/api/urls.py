@@ -0,0 +1,24 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('v1/posts/', views.feed, name='feed'),
+    path('v1/posts/batch/', views.post_batch, name='post_batch'),
+    path('v1/posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('v1/posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
+    path('v1/groups/<slug:slug>/', views.group_detail, name='group_detail'),
+    path('v1/groups/<slug:slug>/posts/', views.group_feed, name='group_feed'),
+    path('v1/profiles/<str:username>/', views.profile_detail,
+         name='profile_detail'),
+    path('v1/profiles/<str:username>/posts/', views.author_feed,
+         name='author_feed'),
+    path('v1/follow/', views.follow_feed, name='follow_feed'),
+    path('v1/autocomplete/', views.autocomplete_view, name='autocomplete'),
+    path('v1/uploads/', views.upload_start, name='upload_start'),
+    path('v1/uploads/<str:token>/', views.upload_detail,
+         name='upload_detail'),
+]
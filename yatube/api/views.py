@@ -0,0 +1,273 @@
+import json
+from functools import partial, wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_http_methods
+
+from core.cache import conditional_page
+from posts.autocomplete import TOP_K, autocomplete
+from posts import uploads
+from posts.models import Group, Post, TimelineEntry, Upload, User
+from posts.paginators import CursorPaginator
+from posts.stats import get_stats
+from posts.views import (
+    follow_tags, group_tags, index_tags, post_detail_tags, profile_tags
+)
+from .serializers import (
+    COMMENT_FIELDS, GROUP_FIELDS, POST_FIELDS, PROFILE_FIELDS, related_for,
+    requested_fields, serialize
+)
+
+MAX_LIMIT = 100
+AUTOCOMPLETE_KINDS = ('user', 'group')
+
+
+def api_view(view_func=None, methods=('GET',)):
+    """По умолчанию только GET, ошибки 404 отдаются в JSON, а не HTML."""
+    if view_func is None:
+        return partial(api_view, methods=methods)
+
+    @require_http_methods(methods)
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse(
+                {'detail': 'Не найдено.'}, status=HTTPStatus.NOT_FOUND
+            )
+    return _wrapped_view
+
+
+def page_size(request):
+    limit = settings.AMOUNT_OF_POSTS_PER_PAGE
+    try:
+        limit = int(request.GET.get('limit', limit))
+    except ValueError:
+        pass
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def cursor_response(request, queryset, fields, available, keys, unwrap=None):
+    """Страница выборки по курсору ``?before=``/``?after=`` в JSON."""
+    paginator = CursorPaginator(queryset, page_size(request), keys=keys)
+    page = paginator.get_cursor_page(
+        before=request.GET.get('before'),
+        after=request.GET.get('after'),
+    )
+    objects = page.object_list
+    if unwrap is not None:
+        objects = [unwrap(obj) for obj in objects]
+    return JsonResponse({
+        'results': [serialize(obj, fields, available) for obj in objects],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+def post_feed(request, queryset):
+    fields = requested_fields(request, POST_FIELDS)
+    return cursor_response(
+        request,
+        queryset.select_related(*related_for(fields)),
+        fields,
+        POST_FIELDS,
+        keys=('pub_date', 'id'),
+    )
+
+
+@api_view
+@conditional_page(index_tags)
+def feed(request):
+    return post_feed(request, Post.objects.all())
+
+
+@api_view
+@conditional_page(group_tags)
+def group_feed(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return post_feed(request, group.posts.all())
+
+
+@api_view
+@conditional_page(profile_tags)
+def author_feed(request, username):
+    author = get_object_or_404(User, username=username)
+    return post_feed(request, author.posts.all())
+
+
+def login_required(view_func):
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Требуется авторизация.'},
+                status=HTTPStatus.UNAUTHORIZED,
+            )
+        return view_func(request, *args, **kwargs)
+    return _wrapped_view
+
+
+@api_view
+@login_required
+def follow_feed(request):
+    return follow_feed_page(request)
+
+
+@conditional_page(follow_tags)
+def follow_feed_page(request):
+    fields = requested_fields(request, POST_FIELDS)
+    entries = TimelineEntry.objects.filter(user=request.user).select_related(
+        'post', *(f'post__{name}' for name in related_for(fields))
+    )
+    return cursor_response(
+        request, entries, fields, POST_FIELDS,
+        keys=('pub_date', 'post_id'), unwrap=lambda entry: entry.post,
+    )
+
+
+@api_view
+@conditional_page(post_detail_tags)
+def post_detail(request, post_id):
+    fields = requested_fields(request, POST_FIELDS)
+    post = get_object_or_404(
+        Post.objects.select_related(*related_for(fields)), pk=post_id
+    )
+    return JsonResponse(serialize(post, fields, POST_FIELDS))
+
+
+@api_view
+def post_batch(request):
+    """Несколько постов одним запросом: ``?ids=1,2,3``.
+
+    Порядок ответа совпадает с порядком ``ids``, отсутствующие посты
+    пропускаются.
+    """
+    try:
+        ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk]
+    except ValueError:
+        return JsonResponse(
+            {'detail': 'ids должен быть списком чисел через запятую.'},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    if len(ids) > MAX_LIMIT:
+        return JsonResponse(
+            {'detail': f'Не больше {MAX_LIMIT} ids за запрос.'},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    fields = requested_fields(request, POST_FIELDS)
+    posts = Post.objects.select_related(*related_for(fields)).in_bulk(ids)
+    return JsonResponse({
+        'results': [
+            serialize(posts[pk], fields, POST_FIELDS)
+            for pk in ids if pk in posts
+        ],
+    })
+
+
+@api_view
+def post_comments(request, post_id):
+    post = get_object_or_404(Post, pk=post_id)
+    fields = requested_fields(request, COMMENT_FIELDS)
+    return cursor_response(
+        request,
+        post.comments.select_related(*related_for(fields)),
+        fields,
+        COMMENT_FIELDS,
+        keys=('created', 'id'),
+    )
+
+
+@api_view
+def group_detail(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    fields = requested_fields(request, GROUP_FIELDS)
+    return JsonResponse(serialize(group, fields, GROUP_FIELDS))
+
+
+@api_view
+def profile_detail(request, username):
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    author.stats = get_stats(author)
+    fields = requested_fields(request, PROFILE_FIELDS)
+    return JsonResponse(serialize(author, fields, PROFILE_FIELDS))
+
+
+@api_view
+def autocomplete_view(request):
+    """Подсказки по префиксу имени: ``?q=ан&kind=user&limit=5``.
+
+    Ответ строится из индекса в памяти, без запросов к базе; выше
+    подсказки те, у кого больше подписчиков или постов в группе.
+    """
+    kind = request.GET.get('kind')
+    if kind and kind not in AUTOCOMPLETE_KINDS:
+        return JsonResponse(
+            {'detail': 'kind должен быть user или group.'},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    try:
+        limit = int(request.GET.get('limit', TOP_K))
+    except ValueError:
+        limit = TOP_K
+    results = autocomplete.search(
+        request.GET.get('q', '').strip(),
+        kinds=(kind,) if kind else AUTOCOMPLETE_KINDS,
+        limit=min(max(limit, 1), TOP_K),
+    )
+    return JsonResponse({'results': results})
+
+
+@api_view(methods=('POST',))
+@login_required
+def upload_start(request):
+    """Начать загрузку картинки по частям.
+
+    Тело — JSON ``{"filename", "size", "sha256"}``. Дальше части
+    отправляются ``PATCH`` на адрес загрузки с заголовком
+    ``Upload-Offset``; ``GET`` того же адреса говорит, с какого байта
+    продолжать после обрыва. Токен завершённой загрузки передаётся
+    в форму поста в поле ``upload``.
+    """
+    try:
+        data = json.loads(request.body)
+        upload = uploads.start(
+            request.user, data.get('filename'), data.get('size'),
+            data.get('sha256'),
+        )
+    except (ValueError, AttributeError):
+        return JsonResponse(
+            {'detail': 'Ожидается JSON-объект.'},
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    except uploads.UploadError as error:
+        return JsonResponse({'detail': error.message}, status=error.status)
+    return JsonResponse(uploads.state(upload), status=HTTPStatus.CREATED)
+
+
+@api_view(methods=('GET', 'PATCH'))
+@login_required
+def upload_detail(request, token):
+    upload = get_object_or_404(Upload, pk=token, user=request.user)
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return JsonResponse(
+                {'detail': 'Нужны заголовки Upload-Offset и Content-Length.'},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+        try:
+            uploads.write_chunk(upload, offset, request, length)
+        except uploads.UploadError as error:
+            return JsonResponse(
+                {'detail': error.message, **uploads.state(upload)},
+                status=error.status,
+            )
+    return JsonResponse(uploads.state(upload))
@@ -0,0 +1,201 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import connections
+from django.views.decorators.http import condition
+
+from . import metrics
+
+TAG_KEY = 'tag_version:{}'
+REFRESH_LOCK_TIMEOUT = 60
+RENDER_POLL_INTERVAL = 0.05
+
+counters = Counter()
+counters_lock = threading.Lock()
+
+
+def count(view_name, event):
+    with counters_lock:
+        counters[view_name, event] += 1
+    metrics.cache_event(f'page_{event}')
+
+
+def cache_stats():
+    """Счётчики кэша страниц: {(представление, событие): число}."""
+    with counters_lock:
+        return dict(counters)
+
+
+def new_version():
+    return time.time_ns()
+
+
+def tag_versions(tags):
+    """Вернуть текущие версии тегов одним ``get_many``.
+
+    Версия — момент последней инвалидации в наносекундах; тегу без версии
+    (новому или вытесненному из кэша) она назначается сейчас.
+    """
+    keys = [TAG_KEY.format(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_tags(tags):
+    """Инвалидировать всё, что закэшировано с любым из тегов."""
+    version = new_version()
+    cache.set_many({TAG_KEY.format(tag): version for tag in tags}, None)
+
+
+def tagged_key(prefix, versions):
+    versions = '.'.join(map(str, versions))
+    return f'{prefix}.{hashlib.md5(versions.encode()).hexdigest()}'
+
+
+def page_versions(request, tags, *args, **kwargs):
+    """Версии тегов страницы, посчитанные один раз за запрос.
+
+    Ими пользуются и ``conditional_page``, и ``cache_page_tagged``, так что
+    теги (и запросы внутри ``tags``) вычисляются однократно.
+    """
+    memo = request.__dict__.setdefault('_page_versions', {})
+    if tags not in memo:
+        memo[tags] = tag_versions(tags(request, *args, **kwargs))
+    return memo[tags]
+
+
+def conditional_page(tags):
+    """Отвечать 304 по ETag/Last-Modified, построенным из версий тегов.
+
+    Валидаторы вычисляются одним ``get_many`` до вызова представления:
+    ETag зависит от версий, полного пути (включая курсор страницы)
+    и пользователя, Last-Modified — время последней инвалидации тегов.
+    """
+    def etag(request, *args, **kwargs):
+        versions = page_versions(request, tags, *args, **kwargs)
+        value = f'{request.get_full_path()}|{request.user.pk}|{versions}'
+        return hashlib.md5(value.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        versions = page_versions(request, tags, *args, **kwargs)
+        return datetime.fromtimestamp(max(versions) / 1e9, tz=timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def refresh_in_background(refresh):
+    def run():
+        try:
+            refresh()
+        finally:
+            connections.close_all()
+    threading.Thread(target=run, daemon=True).start()
+
+
+def refresh_once(key, refresh, view_name):
+    """Запустить фоновое обновление, если его не выполняет другой воркер."""
+    lock_key = f'{key}.refresh'
+    if not cache.add(lock_key, True, REFRESH_LOCK_TIMEOUT):
+        return
+
+    def locked_refresh():
+        try:
+            refresh()
+            count(view_name, 'refresh')
+        finally:
+            cache.delete(lock_key)
+
+    refresh_in_background(locked_refresh)
+
+
+def render_once(key, render):
+    """Промах: страницу рендерит один воркер, остальные ждут её в кэше.
+
+    Нужен бэкенд с межпроцессным ``lock`` (``SQLiteCache``), иначе
+    каждый промах рендерит сам. Если страница так и не появилась
+    (ответ не кэшируется или рендер упал), ждущий рендерит её сам.
+    """
+    lock = getattr(cache, 'lock', None)
+    if lock is None:
+        return render()
+    deadline = time.time() + REFRESH_LOCK_TIMEOUT
+    while True:
+        with lock(f'{key}.render', REFRESH_LOCK_TIMEOUT) as acquired:
+            if acquired:
+                entry = cache.get(key)
+                return render() if entry is None else entry[1]
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[1]
+        if time.time() > deadline:
+            return render()
+        time.sleep(RENDER_POLL_INTERVAL)
+
+
+def cache_page_tagged(timeout, tags, stale_timeout=None):
+    """Кэшировать ответ представления до инвалидации любого из тегов.
+
+    ``tags(request, *args, **kwargs)`` возвращает теги страницы. Ключ
+    учитывает полный путь и пользователя, поэтому страницы с персональной
+    шапкой не смешиваются, а устаревание определяется версиями тегов,
+    а не коротким TTL.
+
+    С ``stale_timeout`` ответ после ``timeout`` секунд ещё
+    ``stale_timeout`` секунд отдаётся сразу, а обновляется в фоновом
+    потоке; обновление ключа захватывает один воркер через ``cache.add``.
+    Промах после инвалидации тоже рендерит один воркер (``render_once``).
+    Попадания, устаревшие попадания, промахи и обновления считаются
+    в ``cache_stats()``.
+    """
+    def decorator(view_func):
+        view_name = f'{view_func.__module__}.{view_func.__name__}'
+
+        def store(key, response):
+            if response.status_code == 200 and not response.cookies:
+                cache.set(
+                    key,
+                    (time.time() + timeout, response),
+                    timeout + (stale_timeout or 0),
+                )
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            key = tagged_key(
+                f'views.{view_name}.{request.user.pk}.'
+                f'{request.get_full_path()}',
+                page_versions(request, tags, *args, **kwargs),
+            )
+            entry = cache.get(key)
+            if entry is None:
+                count(view_name, 'miss')
+
+                def render():
+                    response = view_func(request, *args, **kwargs)
+                    store(key, response)
+                    return response
+
+                return render_once(key, render)
+            fresh_until, response = entry
+            if time.time() < fresh_until:
+                count(view_name, 'hit')
+                return response
+            count(view_name, 'stale_hit')
+            stale_request = copy.copy(request)
+            refresh_once(key, lambda: store(
+                key, view_func(stale_request, *args, **kwargs)
+            ), view_name)
+            return response
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,311 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+CREATE TABLE IF NOT EXISTS cache_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_totals VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_totals SET entries = entries + 1, size = size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache BEGIN
+    UPDATE cache_totals SET size = size - OLD.size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_totals SET entries = entries - 1, size = size - OLD.size;
+END;
+CREATE TABLE IF NOT EXISTS cache_locks (
+    key TEXT PRIMARY KEY,
+    expires REAL NOT NULL
+);
+'''
+
+UPSERT = '''
+INSERT INTO cache (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    expires = excluded.expires,
+    accessed = excluded.accessed,
+    size = excluded.size
+'''
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite (WAL), общий для всех процессов одного хоста.
+
+    В отличие от ``LocMemCache`` все воркеры видят одни и те же записи
+    и инвалидации. Объём ограничен ``MAX_SIZE`` байт и ``MAX_ENTRIES``
+    записей: при превышении сначала удаляются просроченные записи, затем
+    давно не читанные (LRU). ``get_or_set`` с вычисляемым значением
+    выполняет вычисление только в одном процессе, остальные ждут результат.
+
+    Опции: ``MAX_SIZE`` (байт), ``MAX_ENTRIES``, ``LOCK_TIMEOUT`` (секунд,
+    сколько держится блокировка пересчёта), ``TOUCH_INTERVAL`` (секунд,
+    как часто чтение обновляет отметку LRU).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 256 * 1024 * 1024))
+        self._lock_timeout = float(options.get('LOCK_TIMEOUT', 30))
+        self._touch_interval = float(options.get('TOUCH_INTERVAL', 5))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = pid
+        return self._local.connection
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _row(self, db, key, now):
+        row = db.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        if expires is not None and expires <= now:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now)
+            )
+            return None
+        if accessed < now - self._touch_interval:
+            db.execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?', (now, key)
+            )
+        return value
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self._row(self._db, key, time.time())
+        if value is None:
+            return default
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        keys = {
+            self.make_and_validate_key(key, version=version): key
+            for key in keys
+        }
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._db.execute(
+            f'SELECT key, value, accessed FROM cache '
+            f'WHERE key IN ({placeholders}) '
+            f'AND (expires IS NULL OR expires > ?)',
+            (*keys, now),
+        ).fetchall()
+        stale = [key for key, _, accessed in rows
+                 if accessed < now - self._touch_interval]
+        if stale:
+            self._db.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(now, key) for key in stale],
+            )
+        return {keys[key]: pickle.loads(value) for key, value, _ in rows}
+
+    def _entry(self, key, value, timeout, now):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return (key, value, self.get_backend_timeout(timeout), now, len(value))
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._transaction() as db:
+            db.execute(UPSERT, self._entry(key, value, timeout, time.time()))
+            self._cull(db)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        entries = [
+            self._entry(
+                self.make_and_validate_key(key, version=version),
+                value, timeout, now,
+            )
+            for key, value in data.items()
+        ]
+        with self._transaction() as db:
+            db.executemany(UPSERT, entries)
+            self._cull(db)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                UPSERT + ' WHERE cache.expires IS NOT NULL '
+                'AND cache.expires <= ?',
+                (*self._entry(key, value, timeout, now), now),
+            )
+            added = cursor.rowcount == 1
+            if added:
+                self._cull(db)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ?, accessed = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._transaction() as db:
+            value = self._row(db, key, time.time())
+            if value is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(value) + delta
+            value_blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (value_blob, len(value_blob), key),
+            )
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        self._db.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self.make_and_validate_key(key, version=version),)
+             for key in keys],
+        )
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def clear(self):
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache')
+            db.execute('DELETE FROM cache_locks')
+
+    def _cull(self, db):
+        """Вытеснить просроченные, затем самые старые по чтению записи."""
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_totals'
+        ).fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        db.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        entries, size = db.execute(
+            'SELECT entries, size FROM cache_totals'
+        ).fetchone()
+        if not entries:
+            return
+        average = max(size / entries, 1)
+        excess = max(
+            entries - int(self._max_entries * 0.9),
+            int((size - self._max_size * 0.9) / average) + 1,
+        )
+        if excess > 0:
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (excess,),
+            )
+
+    @contextmanager
+    def lock(self, key, timeout=None, version=None):
+        """Межпроцессная блокировка; отдаёт ``True``, если она получена."""
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._db.execute(
+            'INSERT INTO cache_locks (key, expires) VALUES (?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET expires = excluded.expires '
+            'WHERE cache_locks.expires <= ?',
+            (key, now + (timeout or self._lock_timeout), now),
+        )
+        acquired = cursor.rowcount == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._db.execute(
+                    'DELETE FROM cache_locks WHERE key = ?', (key,)
+                )
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """``get_or_set`` с защитой от лавины пересчётов.
+
+        Пока один процесс вычисляет ``default()``, остальные ждут появления
+        значения (не дольше ``LOCK_TIMEOUT``) вместо того, чтобы считать его
+        одновременно.
+        """
+        missing = self._missing_key
+        value = self.get(key, missing, version=version)
+        if value is not missing:
+            return value
+        if not callable(default):
+            return super().get_or_set(key, default, timeout, version)
+        deadline = time.time() + self._lock_timeout
+        while True:
+            with self.lock(f'get_or_set:{key}', version=version) as acquired:
+                if acquired:
+                    value = self.get(key, missing, version=version)
+                    if value is missing:
+                        value = default()
+                        self.set(key, value, timeout, version=version)
+                    return value
+            value = self.get(key, missing, version=version)
+            if value is not missing:
+                return value
+            if time.time() > deadline:
+                return default()
+            time.sleep(0.05)
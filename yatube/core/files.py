@@ -0,0 +1,162 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, StreamingHttpResponse
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+BLOCK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Имена, которые меняются вместе с содержимым: картинки постов и
+# миниатюры sorl (``ab/cd/abcd…``) и статика ManifestStaticFilesStorage
+# (``app.0123456789ab.css``). Такой файл браузер может не перепроверять.
+MEDIA_HASHED = re.compile(
+    r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{28,60}\.\w+$'
+)
+STATIC_HASHED = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+
+def etag(stat):
+    """Как у nginx: время изменения и размер, без чтения файла."""
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """``(начало, длина)`` из ``Range``, ``None`` — отдать файл целиком.
+
+    Поддерживается один диапазон: для нескольких допустимо ответить
+    всем файлом. Невыполнимый диапазон — ``ValueError``.
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        length = min(int(last), size)
+        if not length:
+            raise ValueError(header)
+        return size - length, length
+    first = int(first)
+    if first >= size:
+        raise ValueError(header)
+    last = min(int(last), size - 1) if last else size - 1
+    if last < first:
+        return None
+    return first, last - first + 1
+
+
+def read_range(path, start, length):
+    """Блоки диапазона; файл открывается, только когда тело читают."""
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while length > 0:
+            block = handle.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def serve(request, path, document_root, url_prefix, hashed=None):
+    """Отдать файл из ``document_root`` с ``ETag`` и ``Cache-Control``.
+
+    Файлу с хэшем в имени (``hashed``) ставится ``immutable`` на год,
+    остальным — ``FILE_CACHE_MAX_AGE`` с перепроверкой по ``ETag``.
+    С ``SENDFILE_BACKEND`` сами байты отдаёт веб-сервер: 'nginx' получает
+    ``X-Accel-Redirect`` на ``SENDFILE_URL`` + ``url_prefix`` + путь,
+    'apache' — ``X-Sendfile`` с полным путём. Без него файл читается
+    здесь же, с поддержкой ``Range``.
+    """
+    try:
+        full_path = safe_join(document_root, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Файл не найден.')
+    if not os.path.isfile(full_path):
+        raise Http404('Файл не найден.')
+    tag = etag(stat)
+    if hashed is not None and hashed.search(path):
+        cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        cache_control = f'public, max-age={settings.FILE_CACHE_MAX_AGE}'
+    response = get_conditional_response(
+        request, etag=tag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        response = file_response(
+            request, full_path, f'{url_prefix}{path}', stat, tag
+        )
+    response.headers['ETag'] = tag
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def sendfile_response(full_path, url, content_type):
+    """Ответ для ``SENDFILE_BACKEND``; ``None``, если файл отдаём сами."""
+    backend = settings.SENDFILE_BACKEND
+    if backend == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response.headers['X-Accel-Redirect'] = quote(
+            f'{settings.SENDFILE_URL}{url}'
+        )
+        return response
+    if backend == 'apache':
+        response = HttpResponse(content_type=content_type)
+        response.headers['X-Sendfile'] = full_path
+        return response
+    return None
+
+
+def file_response(request, full_path, url, stat, tag):
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    response = sendfile_response(full_path, url, content_type)
+    if response is not None:
+        return response
+    size = stat.st_size
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if request.headers.get('Range') and if_range in (None, tag):
+        try:
+            byte_range = parse_range(request.headers['Range'], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+    if byte_range is None:
+        status, start, length = 200, 0, size
+    else:
+        status, (start, length) = 206, byte_range
+    if request.method == 'HEAD':
+        # Тело HEAD не отправляется, поэтому файл не открывается.
+        response = HttpResponse(status=status, content_type=content_type)
+    elif byte_range is None:
+        response = FileResponse(
+            open(full_path, 'rb'), content_type=content_type
+        )
+    else:
+        response = StreamingHttpResponse(
+            read_range(full_path, start, length),
+            status=status, content_type=content_type,
+        )
+    response.headers['Content-Length'] = length
+    if byte_range is not None:
+        response.headers['Content-Range'] = (
+            f'bytes {start}-{start + length - 1}/{size}'
+        )
+    response.headers['Accept-Ranges'] = 'bytes'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,346 @@
+import json
+import math
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.files import locks
+from django.template import base
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, math.inf)
+RETIRED = 'retired.json'
+
+HELP = {
+    'yatube_requests_total': ('counter', 'Обработанные запросы.'),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время обработки запроса.'
+    ),
+    'yatube_request_sql_queries': (
+        'histogram', 'Число SQL-запросов на один запрос.'
+    ),
+    'yatube_sql_seconds_total': ('counter', 'Суммарное время SQL.'),
+    'yatube_template_seconds_total': (
+        'counter', 'Суммарное время рендеринга шаблонов.'
+    ),
+    'yatube_cache_events_total': (
+        'counter', 'Попадания и промахи кэша страниц и карточек.'
+    ),
+}
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    """Замеры одного запроса; накапливаются, пока он обрабатывается."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_events = defaultdict(int)
+
+    @property
+    def duration(self):
+        return time.perf_counter() - self.started
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - started
+
+    def server_timing(self, duration):
+        """Значение заголовка ``Server-Timing`` в миллисекундах."""
+        cache_events = ' '.join(
+            f'{event}={number}'
+            for event, number in sorted(self.cache_events.items())
+        )
+        timings = [
+            f'app;dur={duration * 1000:.1f}',
+            f'db;dur={self.sql_time * 1000:.1f};'
+            f'desc="{self.sql_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+        ]
+        if cache_events:
+            timings.append(f'cache;desc="{cache_events}"')
+        return ', '.join(timings)
+
+
+def current():
+    return getattr(_local, 'metrics', None)
+
+
+def start():
+    _local.metrics = RequestMetrics()
+    return _local.metrics
+
+
+def stop():
+    _local.metrics = None
+
+
+def cache_event(event, number=1):
+    """Учесть событие кэша в текущем запросе, если он измеряется."""
+    metrics = current()
+    if metrics is not None and number:
+        metrics.cache_events[event] += number
+
+
+def current_template():
+    """Имя шаблона, который рендерится сейчас в этом потоке."""
+    templates = getattr(_local, 'templates', None)
+    return templates[-1] if templates else None
+
+
+def timed_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        templates = _local.__dict__.setdefault('templates', [])
+        templates.append(self.name)
+        metrics = current()
+        if metrics is None:
+            try:
+                return render(self, context)
+            finally:
+                templates.pop()
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            templates.pop()
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+    wrapper.timed = True
+    return wrapper
+
+
+def install():
+    """Засекать рендеринг шаблонов; вложенные include считаются один раз.
+
+    Заодно запоминается стек рендерящихся шаблонов (``current_template``).
+    """
+    if not getattr(base.Template.render, 'timed', False):
+        base.Template.render = timed_render(base.Template.render)
+
+
+class Registry:
+    """Счётчики процесса, которые периодически сбрасываются в файл.
+
+    Каждый процесс пишет свой ``<pid>-<метка>.json`` в ``METRICS_DIR``
+    не чаще раза в ``METRICS_FLUSH_INTERVAL`` секунд, а ``/metrics``
+    складывает файлы всех процессов. Случайная метка не даёт новому
+    процессу с тем же PID затереть файл прежнего. Файлы завершившихся
+    воркеров ``collect`` переносит в общий ``retired.json``, чтобы
+    счётчики не уменьшались, а каталог не рос.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = defaultdict(float)
+        self.flushed = 0.0
+        self.token = secrets.token_hex(4)
+
+    @property
+    def filename(self):
+        # PID читается каждый раз: после fork у потомка он другой.
+        return f'{os.getpid()}-{self.token}.json'
+
+    def inc(self, name, labels, value=1):
+        self.values[name, tuple(sorted(labels.items()))] += value
+
+    def observe(self, name, labels, value, buckets):
+        for bound in buckets:
+            if value <= bound:
+                le = '+Inf' if bound == math.inf else str(bound)
+                self.inc(f'{name}_bucket', {**labels, 'le': le})
+        self.inc(f'{name}_sum', labels, value)
+        self.inc(f'{name}_count', labels)
+
+    def record(self, view, status, metrics, duration):
+        labels = {'view': view}
+        with self.lock:
+            self.inc('yatube_requests_total', {
+                **labels, 'status': f'{status // 100}xx'
+            })
+            self.observe(
+                'yatube_request_duration_seconds', labels, duration,
+                DURATION_BUCKETS,
+            )
+            self.observe(
+                'yatube_request_sql_queries', labels, metrics.sql_count,
+                QUERY_BUCKETS,
+            )
+            self.inc('yatube_sql_seconds_total', labels, metrics.sql_time)
+            self.inc(
+                'yatube_template_seconds_total', labels,
+                metrics.template_time,
+            )
+            for event, number in metrics.cache_events.items():
+                self.inc(
+                    'yatube_cache_events_total',
+                    {**labels, 'event': event}, number,
+                )
+        self.flush()
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        with self.lock:
+            self.flushed = now
+            samples = [
+                [name, dict(labels), value]
+                for (name, labels), value in self.values.items()
+            ]
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        write_samples(
+            os.path.join(settings.METRICS_DIR, self.filename), samples
+        )
+
+
+registry = Registry()
+
+
+def write_samples(path, samples):
+    """Атомарно заменить файл: у каждого писателя своё временное имя."""
+    descriptor, temporary = tempfile.mkstemp(
+        dir=os.path.dirname(path), suffix='.tmp'
+    )
+    try:
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as output:
+            json.dump(samples, output)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def read_samples(path, totals):
+    try:
+        with open(path, encoding='utf-8') as source:
+            samples = json.load(source)
+    except (OSError, ValueError):
+        return False
+    for name, labels, value in samples:
+        totals[name, tuple(sorted(labels.items()))] += value
+    return True
+
+
+def is_alive(pid):
+    if os.name == 'nt':
+        # На Windows os.kill завершает процесс, проверить его нечем.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def worker_pid(filename):
+    pid = filename.split('-', 1)[0]
+    return int(pid) if pid.isdigit() else None
+
+
+def retire_dead_workers():
+    """Перенести счётчики завершившихся процессов в ``retired.json``.
+
+    Под файловой блокировкой, чтобы два ``/metrics`` не учли один
+    файл дважды.
+    """
+    directory = settings.METRICS_DIR
+    with open(os.path.join(directory, 'retired.lock'), 'a') as lock:
+        locks.lock(lock, locks.LOCK_EX)
+        try:
+            dead = [
+                filename for filename in os.listdir(directory)
+                if filename.endswith('.json')
+                and worker_pid(filename) is not None
+                and not is_alive(worker_pid(filename))
+            ]
+            if not dead:
+                return
+            retired = os.path.join(directory, RETIRED)
+            totals = defaultdict(float)
+            read_samples(retired, totals)
+            for filename in dead:
+                read_samples(os.path.join(directory, filename), totals)
+            write_samples(retired, [
+                [name, dict(labels), value]
+                for (name, labels), value in totals.items()
+            ])
+            for filename in dead:
+                os.unlink(os.path.join(directory, filename))
+        finally:
+            locks.unlock(lock)
+
+
+def collect():
+    """Сложить счётчики всех процессов из ``METRICS_DIR``."""
+    registry.flush(force=True)
+    retire_dead_workers()
+    totals = defaultdict(float)
+    for filename in os.listdir(settings.METRICS_DIR):
+        if filename.endswith('.json'):
+            read_samples(os.path.join(settings.METRICS_DIR, filename), totals)
+    return totals
+
+
+def family(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in HELP:
+            return name[:-len(suffix)]
+    return name
+
+
+def render(totals):
+    """Метрики в текстовом формате Prometheus."""
+    families = defaultdict(list)
+    for (name, labels), value in sorted(totals.items(), key=sort_key):
+        families[family(name)].append((name, labels, value))
+    lines = []
+    for name, samples in families.items():
+        kind, help_text = HELP.get(name, ('untyped', ''))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample, labels, value in samples:
+            labels = ','.join(
+                f'{key}="{escape(text)}"' for key, text in labels
+            )
+            lines.append(f'{sample}{{{labels}}} {number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def sort_key(item):
+    (name, labels), _ = item
+    return name, [
+        (key, float(value) if key == 'le' else value)
+        for key, value in labels
+    ]
+
+
+def number(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def escape(value):
+    return (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
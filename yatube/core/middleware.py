@@ -0,0 +1,76 @@
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+from .queries import QueryLog
+
+
+class MetricsMiddleware:
+    """Замеры запроса: время, SQL, шаблоны и кэш.
+
+    Результат уходит в заголовок ``Server-Timing`` и в счётчики процесса,
+    которые отдаёт ``/metrics``. Стоит первым в ``MIDDLEWARE``, чтобы
+    в замер попали и остальные middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.install()
+
+    def __call__(self, request):
+        request_metrics = metrics.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(request_metrics.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.stop()
+        duration = request_metrics.duration
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = request_metrics.server_timing(
+                duration
+            )
+        match = request.resolver_match
+        metrics.registry.record(
+            match.view_name if match else '<unresolved>',
+            response.status_code, request_metrics, duration,
+        )
+        return response
+
+
+class QueryInspectorMiddleware:
+    """Журнал N+1 и медленных запросов; включается ``QUERY_INSPECTOR``.
+
+    Запрос одной формы, выполненный больше ``QUERY_INSPECTOR_REPEATS``
+    раз, и запросы дольше ``QUERY_INSPECTOR_SLOW_MS`` попадают в логгер
+    ``yatube.queries`` вместе с именем представления и шаблона.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        metrics.install()
+
+    def __call__(self, request):
+        logs = [
+            QueryLog(
+                connection, settings.QUERY_INSPECTOR_REPEATS,
+                settings.QUERY_INSPECTOR_SLOW_MS,
+            )
+            for connection in connections.all()
+        ]
+        with ExitStack() as stack:
+            for log in logs:
+                stack.enter_context(log.connection.execute_wrapper(log))
+            response = self.get_response(request)
+        match = request.resolver_match
+        for log in logs:
+            log.report(match.view_name if match else request.path)
+        return response
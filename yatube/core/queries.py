@@ -0,0 +1,105 @@
+import hashlib
+import logging
+import re
+import time
+from collections import Counter
+
+from django.db import DatabaseError
+
+from . import metrics
+
+logger = logging.getLogger('yatube.queries')
+
+NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+SKIP = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def normalize(sql):
+    """Форма запроса без значений: литералы и списки ``IN`` схлопнуты."""
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+class QueryLog:
+    """SQL одного запроса: повторы одной формы и медленные запросы.
+
+    Подключается через ``connection.execute_wrapper``. Для запросов
+    дольше ``slow_ms`` сразу снимается план (``EXPLAIN QUERY PLAN``
+    в SQLite, ``EXPLAIN`` в остальных базах), пока параметры под рукой.
+    """
+
+    def __init__(self, connection, repeat_threshold, slow_ms):
+        self.connection = connection
+        self.repeat_threshold = repeat_threshold
+        self.slow_ms = slow_ms
+        self.counts = Counter()
+        self.samples = {}
+        self.slow = []
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining or sql.lstrip().upper().startswith(SKIP):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            template = metrics.current_template()
+            key = fingerprint(sql)
+            self.counts[key] += 1
+            self.samples.setdefault(key, (sql, template))
+            if duration >= self.slow_ms:
+                self.slow.append((
+                    duration, sql, template, self.explain(sql, params, many)
+                ))
+
+    def explain(self, sql, params, many):
+        if many or not sql.lstrip().upper().startswith('SELECT'):
+            return ''
+        prefix = (
+            'EXPLAIN QUERY PLAN' if self.connection.vendor == 'sqlite'
+            else 'EXPLAIN'
+        )
+        self.explaining = True
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {sql}', params)
+                return '\n'.join(
+                    str(row[-1]) if len(row) > 1 else str(row[0])
+                    for row in cursor.fetchall()
+                )
+        except DatabaseError as error:
+            return f'(план недоступен: {error})'
+        finally:
+            self.explaining = False
+
+    def repeated(self):
+        return [
+            (count, *self.samples[key])
+            for key, count in self.counts.most_common()
+            if count > self.repeat_threshold
+        ]
+
+    def report(self, view):
+        for count, sql, template in self.repeated():
+            logger.warning(
+                'N+1: %s раз одна форма запроса; view=%s template=%s\n%s',
+                count, view, template, sql,
+            )
+        for duration, sql, template, plan in self.slow:
+            logger.warning(
+                'Медленный запрос %.1f мс; view=%s template=%s\n%s\n%s',
+                duration, view, template, sql, plan,
+            )
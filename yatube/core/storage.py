@@ -0,0 +1,48 @@
+import hashlib
+import os
+import re
+import secrets
+
+from django.core.files.storage import FileSystemStorage
+
+HASHED_NAME = re.compile(
+    r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}(?:\.\w+)?$'
+)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы называются SHA-256 содержимого: ``posts/ab/cd/abcd….jpg``.
+
+    Каталог из ``upload_to`` сохраняется, а под ним файлы раскладываются
+    по двум уровням подкаталогов из первых байтов хэша, чтобы в одном
+    каталоге не копились сотни тысяч файлов. Одинаковые загрузки
+    получают одно имя и хранятся один раз; когда файл можно удалять,
+    решает вызывающий код (см. ``posts.media``).
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return '/'.join(filter(None, (
+            directory, digest[:2], digest[2:4], f'{digest}{extension}'
+        )))
+
+    def is_hashed(self, name):
+        return bool(HASHED_NAME.search(name))
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        # Файл пишется под временным именем и переименовывается атомарно:
+        # параллельная загрузка того же содержимого не увидит его
+        # недописанным, а перезапись одинаковыми байтами безвредна.
+        temporary = super()._save(
+            f'{name}.{secrets.token_hex(8)}.part', content
+        )
+        os.replace(self.path(temporary), self.path(name))
+        return name
@@ -0,0 +1,17 @@
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """``DiscoverRunner`` с настройками из ``yatube.settings_test``."""
+
+    def setup_test_environment(self, **kwargs):
+        from yatube import settings_test
+
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(**settings_test.OVERRIDES)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
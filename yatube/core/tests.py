@@ -0,0 +1,414 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.http import HttpResponse
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+from django.urls import resolve, reverse
+
+from core import metrics
+from core.cache import bump_tags, cache_page_tagged, cache_stats
+from core.cache_backends import SQLiteCache
+from core.middleware import QueryInspectorMiddleware
+from core.queries import fingerprint
+from core.storage import ContentAddressedStorage
+from posts.models import Comment, Post, User
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(
+            str(Path(self.tmp_dir) / 'cache.sqlite3'),
+            {'OPTIONS': options},
+        )
+
+    def test_values_are_shared_between_instances(self):
+        """Запись видна через другое подключение к тому же файлу."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.make_cache().get('key'), {'value': 1})
+        self.assertEqual(
+            self.make_cache().get_many(['key', 'missing']),
+            {'key': {'value': 1}}
+        )
+
+    def test_add_incr_delete_and_expiry(self):
+        """Базовые операции кэша работают как у встроенных бэкендов."""
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        self.cache.set('short', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 'again'))
+        self.assertTrue(self.cache.delete('counter'))
+        self.assertFalse(self.cache.has_key('counter'))
+
+    def test_lru_eviction_respects_max_entries(self):
+        """При переполнении вытесняются давно не читанные записи."""
+        cache = self.make_cache(MAX_ENTRIES=10, TOUCH_INTERVAL=0)
+        for i in range(10):
+            cache.set(f'key{i}', i)
+        time.sleep(0.01)
+        cache.get('key0')
+        cache.set('key10', 10)
+        self.assertEqual(cache.get('key0'), 0)
+        self.assertIsNone(cache.get('key1'))
+        self.assertLessEqual(len(cache.get_many(
+            [f'key{i}' for i in range(11)]
+        )), 10)
+
+    def test_get_or_set_computes_once(self):
+        """Одновременные промахи вычисляют значение один раз."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    self.make_cache().get_or_set('hot', compute, 60)
+                )
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 4)
+        self.assertEqual(len(calls), 1)
+
+
+class StaleWhileRevalidateTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.renders = 0
+
+        def view(request):
+            self.renders += 1
+            return HttpResponse(str(self.renders))
+
+        self.view = cache_page_tagged(
+            0.2, lambda request: ['swr:test'], stale_timeout=60
+        )(view)
+
+    def get(self):
+        request = RequestFactory().get('/swr/')
+        request.user = AnonymousUser()
+        return self.view(request).content
+
+    @mock.patch('core.cache.refresh_in_background', lambda refresh: refresh())
+    def test_stale_response_is_served_and_refreshed(self):
+        """Устаревший ответ отдаётся сразу и обновляется в фоне."""
+        before = cache_stats()
+        self.assertEqual(self.get(), b'1')
+        self.assertEqual(self.get(), b'1')
+        time.sleep(0.25)
+        self.assertEqual(self.get(), b'1')
+        self.assertEqual(self.get(), b'2')
+        stats = cache_stats()
+        for event, expected in [
+            ('miss', 1), ('hit', 2), ('stale_hit', 1), ('refresh', 1)
+        ]:
+            key = ('core.tests.view', event)
+            with self.subTest(event=event):
+                self.assertEqual(stats[key] - before.get(key, 0), expected)
+
+
+class SingleFlightMissTests(SimpleTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        settings = override_settings(CACHES={'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': os.path.join(tmp_dir, 'cache.sqlite3'),
+        }})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.renders = []
+
+        def view(request):
+            self.renders.append(1)
+            time.sleep(0.2)
+            return HttpResponse(str(len(self.renders)))
+
+        self.view = cache_page_tagged(60, lambda request: ['sf:test'])(view)
+        bump_tags(['sf:test'])
+
+    def get(self):
+        request = RequestFactory().get('/single-flight/')
+        request.user = AnonymousUser()
+        return self.view(request).content
+
+    def test_concurrent_misses_render_once(self):
+        """Одновременные промахи после инвалидации рендерят страницу раз."""
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.get()))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [b'1'] * 4)
+        self.assertEqual(len(self.renders), 1)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        settings = override_settings(
+            METRICS_DIR=self.metrics_dir, METRICS_TOKEN='secret'
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+
+    def scrape(self, **headers):
+        headers.setdefault('HTTP_AUTHORIZATION', 'Bearer secret')
+        return Client().get('/metrics', **headers)
+
+    def test_server_timing_header(self):
+        """Ответ несёт время приложения, SQL, шаблонов и события кэша."""
+        response = Client().get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        for metric in ('app;dur=', 'db;dur=', 'tpl;dur=', 'page_miss=1'):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, timing)
+
+    def test_metrics_merge_worker_files(self):
+        """/metrics складывает счётчики всех процессов."""
+        Client().get(reverse('about:tech'))
+        metrics.registry.flush(force=True)
+        own_file = os.path.join(self.metrics_dir, metrics.registry.filename)
+        with open(own_file) as f:
+            samples = json.load(f)
+        with open(os.path.join(self.metrics_dir, '1-worker.json'), 'w') as f:
+            json.dump(samples, f)
+        own = metrics.registry.values[
+            'yatube_requests_total',
+            (('status', '2xx'), ('view', 'about:tech')),
+        ]
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            f'yatube_requests_total{{status="2xx",view="about:tech"}} '
+            f'{int(own * 2)}\n',
+            response.content.decode(),
+        )
+        self.assertIn(
+            '# TYPE yatube_request_duration_seconds histogram',
+            response.content.decode(),
+        )
+
+    def test_dead_workers_are_retired(self):
+        """Файл завершившегося процесса сливается в retired.json."""
+        worker = subprocess.Popen([sys.executable, '-c', ''])
+        worker.wait()
+        samples = [['yatube_requests_total', {'view': 'x'}, 3]]
+        for name in (f'{worker.pid}-a.json', f'{worker.pid}-b.json'):
+            with open(os.path.join(self.metrics_dir, name), 'w') as f:
+                json.dump(samples, f)
+        for _ in range(2):
+            response = self.scrape()
+            self.assertIn(
+                'yatube_requests_total{view="x"} 6\n',
+                response.content.decode(),
+            )
+        files = sorted(
+            name for name in os.listdir(self.metrics_dir)
+            if name.endswith('.json')
+        )
+        self.assertEqual(files, [metrics.registry.filename, 'retired.json'])
+
+    def test_metrics_require_token(self):
+        """Без верного токена /metrics закрыт, откуда бы ни пришёл запрос."""
+        for header in ('', 'Bearer wrong', 'secret'):
+            with self.subTest(header=header):
+                response = self.scrape(HTTP_AUTHORIZATION=header)
+                self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            response = self.scrape(HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, 403)
+
+
+@override_settings(
+    QUERY_INSPECTOR=True, QUERY_INSPECTOR_REPEATS=3,
+    QUERY_INSPECTOR_SLOW_MS=10_000,
+)
+class QueryInspectorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(text='Пост', author=author)
+        for i in range(5):
+            commenter = User.objects.create_user(username=f'reader{i}')
+            Comment.objects.create(post=post, author=commenter, text='Ок')
+        cls.post = post
+
+    def inspect(self, view):
+        request = RequestFactory().get(f'/posts/{self.post.pk}/')
+        request.resolver_match = resolve(request.path)
+        with self.assertLogs('yatube.queries', 'WARNING') as logs:
+            QueryInspectorMiddleware(view)(request)
+        return '\n'.join(logs.output)
+
+    def test_repeated_query_shape_is_reported(self):
+        """Повтор одной формы запроса в цикле попадает в журнал."""
+        def view(request):
+            names = [c.author.username for c in self.post.comments.all()]
+            return HttpResponse(' '.join(names))
+
+        output = self.inspect(view)
+        self.assertIn('N+1: 5 раз', output)
+        self.assertIn('view=posts:post_detail', output)
+
+    @override_settings(QUERY_INSPECTOR_SLOW_MS=0)
+    def test_slow_query_is_logged_with_plan(self):
+        """Медленный запрос пишется вместе с планом выполнения."""
+        def view(request):
+            return HttpResponse(Post.objects.filter(text='Пост').count())
+
+        self.assertIn('Медленный запрос', self.inspect(view))
+        self.assertIn('SCAN', self.inspect(view))
+
+    def test_fingerprint_ignores_values(self):
+        """Запросы, отличающиеся только значениями, имеют одну форму."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3) AND a = 'x'"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) AND a = 'y'"),
+        )
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.tmp_dir)
+
+    def test_identical_content_is_stored_once(self):
+        """Имя — хэш содержимого в подкаталогах, дубликат не пишется."""
+        first = self.storage.save('posts/a.JPG', ContentFile(b'same'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'same'))
+        other = self.storage.save('posts/c.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertRegex(first, r'^posts/(\w\w)/(\w\w)/\1\2[0-9a-f]{60}\.jpg$')
+        self.assertTrue(self.storage.is_hashed(first))
+        self.assertFalse(self.storage.is_hashed('posts/a.jpg'))
+        files = [
+            name for _, _, names in os.walk(self.tmp_dir) for name in names
+        ]
+        self.assertEqual(len(files), 2)
+
+
+class FileServingTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.hashed = 'posts/ab/cd/abcd' + '0' * 60 + '.jpg'
+        for name in ('posts/photo.jpg', self.hashed):
+            path = Path(self.tmp_dir, name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b'0123456789')
+        settings = override_settings(MEDIA_ROOT=self.tmp_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get(self, name, **headers):
+        return self.client.get(f'/media/{name}', **headers)
+
+    def test_full_file_with_validators(self):
+        """Файл отдаётся целиком с ETag; совпавший ETag даёт 304."""
+        response = self.get('posts/photo.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        etag = response['ETag']
+        response = self.get('posts/photo.jpg', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_hashed_name_is_immutable(self):
+        response = self.get(self.hashed)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_range_requests(self):
+        response = self.get('posts/photo.jpg', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+        response = self.get('posts/photo.jpg', HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        response = self.get('posts/photo.jpg', HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        response = self.get(
+            'posts/photo.jpg', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_head_does_not_open_file(self):
+        """HEAD отдаёт заголовки без тела и не открывает файл."""
+        with mock.patch('core.files.open', create=True) as file_open:
+            response = self.client.head('/media/posts/photo.jpg')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Length'], '10')
+            self.assertEqual(response['Accept-Ranges'], 'bytes')
+            response = self.client.head(
+                '/media/posts/photo.jpg', HTTP_RANGE='bytes=2-5'
+            )
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Length'], '4')
+            self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        file_open.assert_not_called()
+
+    def test_sendfile_backends(self):
+        """С веб-сервером Django отдаёт только заголовки."""
+        with override_settings(SENDFILE_BACKEND='nginx'):
+            response = self.get('posts/photo.jpg')
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/internal/media/posts/photo.jpg'
+        )
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+        with override_settings(SENDFILE_BACKEND='apache'):
+            response = self.get('posts/photo.jpg')
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(self.tmp_dir, 'posts', 'photo.jpg'),
+        )
+
+    def test_missing_and_outside_files(self):
+        self.assertEqual(self.get('posts/nope.jpg').status_code, 404)
+        self.assertEqual(self.get('posts').status_code, 404)
+        self.assertEqual(self.get('../etc/passwd').status_code, 404)
+        response = self.client.post('/media/posts/photo.jpg')
+        self.assertEqual(response.status_code, 405)
@@ -1,4 +1,12 @@
+import hmac
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_safe
+
+from . import files, metrics
 
 
 def page_not_found(request, exception):
@@ -15,3 +23,38 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics_view(request):
+    """Счётчики всех воркеров в текстовом формате Prometheus.
+
+    Доступ — по ``Authorization: Bearer <METRICS_TOKEN>``; адрес клиента
+    не проверяется, за прокси он у всех один. Без токена в настройках
+    ``/metrics`` закрыт.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(
+        header.encode(), f'Bearer {token}'.encode()
+    ):
+        raise PermissionDenied
+    return HttpResponse(
+        metrics.render(metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@require_safe
+def media_view(request, path):
+    """Загруженные файлы; см. ``core.files.serve``."""
+    return files.serve(
+        request, path, settings.MEDIA_ROOT, 'media/', files.MEDIA_HASHED
+    )
+
+
+@require_safe
+def static_view(request, path):
+    """Собранная ``collectstatic`` статика, когда нет ``DEBUG``."""
+    return files.serve(
+        request, path, settings.STATIC_ROOT, 'static/', files.STATIC_HASHED
+    )
@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.db import connection
+from .autocomplete import autocomplete
 from .models import Post, Group, Follow, Comment
+from .search import match_expression, matching_ids
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -15,6 +18,20 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Искать по индексу FTS5 вместо ``LIKE '%term%'``.
+
+        Строка без слов (``!!!``) дала бы пустой ``MATCH``, на котором
+        SQLite падает, — по ней ничего не находится.
+        """
+        if not search_term or connection.vendor != 'sqlite':
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        if not match_expression(search_term):
+            return queryset.none(), False
+        return queryset.filter(pk__in=matching_ids(search_term)), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -27,6 +44,15 @@ class GroupAdmin(admin.ModelAdmin):
     list_filter = ('title',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Искать slug по префиксу в индексе подсказок."""
+        if not search_term:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        pks = autocomplete.index('group').prefix_pks(search_term.strip())
+        return queryset.filter(pk__in=pks), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Comment)
@@ -0,0 +1,331 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from heapq import nsmallest
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import AuthorStats, Group, User
+
+TOP_K = 10
+TOP_PREFIX_LENGTH = 3
+SCAN_LIMIT = 5000
+SYNC_INTERVAL = 1
+MAX_REPLAY = 10000
+CHANGE_TIMEOUT = 60 * 60
+
+SEQUENCE_KEY = 'autocomplete:sequence'
+CHANGE_KEY = 'autocomplete:change:{}'
+
+END = '\U0010ffff'
+
+
+class PrefixIndex:
+    """Отсортированный массив имён с поиском по префиксу через ``bisect``.
+
+    Для префиксов до ``TOP_PREFIX_LENGTH`` символов лучшие ``TOP_K``
+    записей по весу хранятся готовыми: под «a» подходит слишком много
+    имён, чтобы ранжировать их на каждый запрос. Более длинные префиксы
+    ранжируются по диапазону массива, но не дальше ``SCAN_LIMIT`` записей.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = {pk: (name, weight) for pk, name, weight in entries}
+        self.keys = sorted(
+            (name.lower(), pk) for pk, (name, _) in self.entries.items()
+        )
+        self.top = {}
+        for pk in sorted(self.entries, key=self.rank):
+            for prefix in self.prefixes(pk):
+                top = self.top.setdefault(prefix, [])
+                if len(top) < TOP_K:
+                    top.append(pk)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def rank(self, pk):
+        name, weight = self.entries[pk]
+        return -weight, name.lower(), pk
+
+    def prefixes(self, pk):
+        key = self.entries[pk][0].lower()
+        return [key[:length] for length in range(
+            1, min(len(key), TOP_PREFIX_LENGTH) + 1
+        )]
+
+    def bounds(self, prefix):
+        return (
+            bisect_left(self.keys, (prefix,)),
+            bisect_left(self.keys, (prefix + END,)),
+        )
+
+    def prefix_pks(self, prefix, limit=None):
+        """Все id с таким префиксом в порядке имён."""
+        low, high = self.bounds(prefix.lower())
+        if limit is not None:
+            high = min(high, low + limit)
+        return [pk for _, pk in self.keys[low:high]]
+
+    def search(self, prefix, limit=TOP_K):
+        """Лучшие по весу записи ``(pk, name, weight)`` с префиксом."""
+        prefix = prefix.lower()
+        if not prefix:
+            return []
+        if len(prefix) <= TOP_PREFIX_LENGTH:
+            pks = self.top.get(prefix, [])[:limit]
+        else:
+            pks = nsmallest(
+                limit, self.prefix_pks(prefix, SCAN_LIMIT), key=self.rank
+            )
+        return [(pk, *self.entries[pk]) for pk in pks]
+
+    def _refill(self, prefix):
+        candidates = self.prefix_pks(prefix)
+        if candidates:
+            self.top[prefix] = nsmallest(TOP_K, candidates, key=self.rank)
+        else:
+            self.top.pop(prefix, None)
+
+    def _offer(self, prefix, pk):
+        top = self.top.setdefault(prefix, [])
+        if pk in top:
+            top.remove(pk)
+        elif len(top) >= TOP_K and self.rank(pk) > self.rank(top[-1]):
+            return
+        top.append(pk)
+        top.sort(key=self.rank)
+        del top[TOP_K:]
+
+    def upsert(self, pk, name, weight=None):
+        previous = self.entries.get(pk)
+        if previous is not None:
+            if weight is None:
+                weight = previous[1]
+            if previous[0] != name:
+                self.remove(pk)
+                previous = None
+        if previous is None:
+            self.entries[pk] = (name, weight or 0)
+            insort(self.keys, (name.lower(), pk))
+            for prefix in self.prefixes(pk):
+                self._offer(prefix, pk)
+            return
+        self.set_weight(pk, weight)
+
+    def add_weight(self, pk, delta):
+        previous = self.entries.get(pk)
+        if previous is not None:
+            self.set_weight(pk, max(previous[1] + delta, 0))
+
+    def set_weight(self, pk, weight):
+        previous = self.entries.get(pk)
+        if previous is None or previous[1] == weight:
+            return
+        self.entries[pk] = (previous[0], weight)
+        for prefix in self.prefixes(pk):
+            if weight < previous[1] and pk in self.top.get(prefix, ()):
+                self._refill(prefix)
+            else:
+                self._offer(prefix, pk)
+
+    def remove(self, pk):
+        if pk not in self.entries:
+            return
+        prefixes = self.prefixes(pk)
+        name = self.entries.pop(pk)[0]
+        index = bisect_left(self.keys, (name.lower(), pk))
+        del self.keys[index]
+        for prefix in prefixes:
+            if pk in self.top.get(prefix, ()):
+                self._refill(prefix)
+
+
+def load_users():
+    return PrefixIndex(
+        (pk, username, followers or 0)
+        for pk, username, followers in User.objects.values_list(
+            'pk', 'username', 'stats__followers_count'
+        ).iterator()
+    )
+
+
+def load_groups():
+    return PrefixIndex(
+        (pk, slug, posts or 0)
+        for pk, slug, posts in Group.objects.annotate(
+            posts_count=Count('posts')
+        ).values_list('pk', 'slug', 'posts_count').iterator()
+    )
+
+
+LOADERS = {'user': load_users, 'group': load_groups}
+
+
+class Autocomplete:
+    """Индексы пользователей и групп в памяти процесса.
+
+    Изменения из сигналов применяются локально и публикуются в общий кэш
+    как журнал с номером из ``cache.incr``; остальные процессы не чаще
+    раза в ``SYNC_INTERVAL`` секунд дочитывают журнал. Веса пользователей
+    в журнале абсолютные, веса групп — приращения: повтор после
+    перезагрузки может ненадолго сдвинуть вес группы, что для подсказок
+    безвредно. Если записи журнала нет и при следующей синхронизации,
+    индекс перестраивается из базы.
+
+    Перестройка идёт вне ``self.lock`` и одним потоком: остальные до
+    подмены отвечают по старым индексам.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.load_lock = threading.Lock()
+        self.indexes = None
+        self.sequence = 0
+        self.synced = 0.0
+        self.waiting = None
+
+    def load(self, wait=True):
+        if not self.load_lock.acquire(blocking=wait):
+            return
+        try:
+            sequence = cache.get(SEQUENCE_KEY, 0)
+            indexes = {kind: load() for kind, load in LOADERS.items()}
+            with self.lock:
+                self.indexes = indexes
+                self.sequence = sequence
+                self.waiting = None
+                self.synced = time.monotonic()
+        finally:
+            self.load_lock.release()
+
+    def sync(self):
+        if self.indexes is None:
+            with self.load_lock:
+                loaded = self.indexes is not None
+            if not loaded:
+                self.load()
+            return
+        with self.lock:
+            reload = self.replay()
+        if reload:
+            self.load(wait=False)
+
+    def replay(self):
+        """Дочитать журнал; ``True`` — индексы надо перестроить."""
+        if time.monotonic() - self.synced < SYNC_INTERVAL:
+            return False
+        self.synced = time.monotonic()
+        sequence = cache.get(SEQUENCE_KEY, 0)
+        if sequence == self.sequence:
+            return False
+        if not 0 < sequence - self.sequence <= MAX_REPLAY:
+            return True
+        numbers = range(self.sequence + 1, sequence + 1)
+        changes = cache.get_many([CHANGE_KEY.format(n) for n in numbers])
+        for number in numbers:
+            change = changes.get(CHANGE_KEY.format(number))
+            if change is None:
+                # publish() берёт номер до того, как кладёт запись: она
+                # могла ещё не появиться. Второй промах — запись потеряна.
+                if self.waiting == number:
+                    return True
+                self.waiting = number
+                return False
+            if change[0] == 'reload':
+                return True
+            self.apply(change)
+            self.sequence = number
+        self.waiting = None
+        return False
+
+    def apply(self, change):
+        operation, kind, pk, *args = change
+        index = self.indexes[kind]
+        if operation == 'upsert':
+            index.upsert(pk, *args)
+        elif operation == 'weight':
+            index.set_weight(pk, *args)
+        elif operation == 'add_weight':
+            index.add_weight(pk, *args)
+        else:
+            index.remove(pk)
+
+    def index(self, kind):
+        self.sync()
+        return self.indexes[kind]
+
+    def search(self, prefix, kinds=('user', 'group'), limit=TOP_K):
+        self.sync()
+        with self.lock:
+            results = [
+                (weight, kind, name)
+                for kind in kinds
+                for _, name, weight in self.indexes[kind].search(
+                    prefix, limit
+                )
+            ]
+        results.sort(key=lambda result: (-result[0], result[2].lower()))
+        return [
+            {'kind': kind, 'name': name, 'weight': weight}
+            for weight, kind, name in results[:limit]
+        ]
+
+    def publish(self, change):
+        cache.add(SEQUENCE_KEY, 0, None)
+        sequence = cache.incr(SEQUENCE_KEY)
+        cache.set(CHANGE_KEY.format(sequence), change, CHANGE_TIMEOUT)
+        if change[0] == 'reload':
+            self.load()
+            return
+        with self.lock:
+            if self.indexes is not None and self.sequence == sequence - 1:
+                self.apply(change)
+                self.sequence = sequence
+
+    def changed(self, *change):
+        """Опубликовать изменение после фиксации транзакции."""
+        transaction.on_commit(lambda: self.publish(change))
+
+
+autocomplete = Autocomplete()
+
+
+def reload():
+    """Перестроить индексы во всех процессах после массовой загрузки.
+
+    ``bulk_create`` не шлёт сигналов, поэтому импорт и генерация данных
+    вызывают это в конце.
+    """
+    autocomplete.changed('reload', None, None)
+
+
+def user_saved(user):
+    autocomplete.changed('upsert', 'user', user.pk, user.username)
+
+
+def user_deleted(user):
+    autocomplete.changed('remove', 'user', user.pk)
+
+
+def group_saved(group):
+    autocomplete.changed('upsert', 'group', group.pk, group.slug)
+
+
+def group_deleted(group):
+    autocomplete.changed('remove', 'group', group.pk)
+
+
+def followers_changed(author_id):
+    followers = AuthorStats.objects.filter(author_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    autocomplete.changed('weight', 'user', author_id, followers or 0)
+
+
+def group_posts_changed(group_id, delta):
+    if group_id is None:
+        return
+    autocomplete.changed('add_weight', 'group', group_id, delta)
@@ -0,0 +1,89 @@
+import csv
+import json
+import zlib
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+COLUMNS = ['kind', 'id', 'post', 'pub_date', 'group', 'image', 'text']
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_rows(author):
+    """Посты и комментарии автора по одному, без загрузки всей выборки."""
+    posts = author.posts.select_related('group').order_by('id')
+    for post in posts.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'kind': 'post',
+            'id': post.pk,
+            'post': None,
+            'pub_date': post.pub_date.isoformat(),
+            'group': post.group.slug if post.group_id else None,
+            'image': post.image.name or None,
+            'text': post.text,
+        }
+    comments = author.comments.order_by('id')
+    for comment in comments.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'kind': 'comment',
+            'id': comment.pk,
+            'post': comment.post_id,
+            'pub_date': comment.created.isoformat(),
+            'group': None,
+            'image': None,
+            'text': comment.text,
+        }
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([
+            '' if row[column] is None else row[column] for column in COLUMNS
+        ])
+
+
+def encoded(lines):
+    """Склеить строки в блоки по ``BUFFER_SIZE`` байт."""
+    buffer = []
+    size = 0
+    for line in lines:
+        line = line.encode()
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(author, export_format='ndjson', compress=False):
+    lines = ndjson_lines if export_format == 'ndjson' else csv_lines
+    chunks = encoded(lines(export_rows(author)))
+    return gzipped(chunks) if compress else chunks
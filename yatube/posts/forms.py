@@ -1,14 +1,86 @@
-from .models import Post, Comment
+from . import uploads
+from .ingest import IngestError, check_size, ingest
+from .models import Comment, Group, Post
 from django import forms
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
 
 
 class PostForm(forms.ModelForm):
+    """Пост; картинка — файлом в ``image`` или токеном ``upload``.
+
+    Токен загрузки по частям (``posts.uploads``) не поле формы: вид
+    берёт его из ``request.POST`` и передаёт аргументом ``upload``.
+    """
+
     class Meta:
         model = Post
         fields = ['text', 'group', 'image']
 
+    def __init__(self, *args, user=None, upload='', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        self.upload_token = upload
+        self.completed_upload = None
+
+    def clean_image(self):
+        """Проверить и пережать новую картинку (см. ``posts.ingest``)."""
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            check_size(image.size)
+            data = ingest(image.read())
+        except IngestError as error:
+            raise forms.ValidationError(str(error))
+        return ContentFile(data, name=image.name)
+
+    def clean(self):
+        """Взять картинку из загрузки по частям, если передан её токен."""
+        cleaned_data = super().clean()
+        token = self.upload_token
+        if not token or self.user is None:
+            return cleaned_data
+        upload = uploads.completed(self.user, token)
+        if upload is None:
+            self.add_error('image', 'Загрузка не найдена или не завершена.')
+            return cleaned_data
+        try:
+            data = ingest(uploads.read(upload))
+        except IngestError as error:
+            self.add_error('image', str(error))
+            return cleaned_data
+        cleaned_data['image'] = ContentFile(data, name=upload.filename)
+        self.completed_upload = upload
+        return cleaned_data
+
+    @property
+    def image_changed(self):
+        return (
+            'image' in self.changed_data
+            or self.completed_upload is not None
+        )
+
+    def save(self, commit=True):
+        post = super().save(commit)
+        if commit and self.completed_upload is not None:
+            self.completed_upload.delete()
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ['text']
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Поиск', max_length=200, required=False)
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        to_field_name='slug',
+        required=False,
+        empty_label='Все группы',
+        label='Группа',
+    )
+    author = forms.CharField(label='Автор', max_length=150, required=False)
@@ -0,0 +1,279 @@
+import csv
+import gzip
+import json
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import bump_tags
+from . import autocomplete, media, stats, thumbnails, timeline
+from .models import (
+    Comment, Follow, Group, ImportedPost, ImportRun, Post, User
+)
+
+BATCH_SIZE = 1000
+# Не больше стольких значений в одном ``IN (...)``: у SQLite есть лимит
+# на число параметров запроса.
+IN_BATCH_SIZE = 500
+
+FORMATS = ('ndjson', 'csv')
+
+
+class ImportRowError(ValueError):
+    """Строку выгрузки нельзя разобрать; номер строки есть в тексте."""
+
+    def __init__(self, number, message):
+        super().__init__(f'Строка {number}: {message}')
+
+
+def chunked(items, size=IN_BATCH_SIZE):
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def read_rows(path, import_format):
+    """Строки выгрузки (см. ``posts.export``) по одной; ``.gz`` читается
+    без распаковки на диск."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as source:
+        if import_format == 'csv':
+            yield from csv.DictReader(source)
+            return
+        number = 0
+        for line in source:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                raise ImportRowError(number, f'некорректный JSON ({error})')
+
+
+def bulk_create_dated(model, objects, **kwargs):
+    """``bulk_create``, который сохраняет даты из самих объектов.
+
+    ``bulk_create`` вызывает ``pre_save``, и ``auto_now_add`` подменяет
+    дату текущей. Исходные значения возвращаются ``bulk_update`` в той же
+    транзакции — общее для всех потоков поле модели не меняется.
+    """
+    fields = [
+        field.attname for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    dates = [
+        [getattr(obj, field) for field in fields] for obj in objects
+    ]
+    with transaction.atomic():
+        created = model.objects.bulk_create(objects, **kwargs)
+        if fields and objects and not kwargs.get('ignore_conflicts'):
+            for obj, values in zip(objects, dates):
+                for field, value in zip(fields, values):
+                    if value is not None:
+                        setattr(obj, field, value)
+            model.objects.bulk_update(objects, fields)
+    return created
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'некорректная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class Importer:
+    """Пакетный импорт постов и комментариев.
+
+    Авторы и группы находятся через словари в памяти, записи вставляются
+    ``bulk_create`` пачками по ``batch_size`` строк, каждая пачка — в своей
+    транзакции. В той же транзакции сдвигается ``ImportRun.done`` и
+    записываются id новых постов (``ImportedPost``), так что прерванный
+    импорт продолжается ровно с первой незаписанной пачки. Счётчики, ленты
+    и кэш страниц обновляются один раз в ``finish()``, а не на каждую строку.
+    """
+
+    def __init__(self, name, default_author=None, create_missing=False,
+                 batch_size=BATCH_SIZE):
+        self.name = name
+        self.default_author = default_author
+        self.create_missing = create_missing
+        self.batch_size = batch_size
+        self.authors = {}
+        self.groups = {}
+        self.done = 0
+        self.post_ids = {}
+        self.posts = 0
+        self.comments = 0
+        self.skipped = 0
+
+    def start(self):
+        """Начать импорт заново, забыв прогресс прошлого запуска."""
+        ImportRun.objects.filter(name=self.name).delete()
+        ImportRun.objects.create(name=self.name)
+
+    def resume(self):
+        """Продолжить сохранённый импорт; ``False``, если его нет."""
+        run = ImportRun.objects.filter(name=self.name).first()
+        if run is None:
+            return False
+        self.done = run.done
+        self.post_ids = dict(ImportedPost.objects.filter(
+            run_id=self.name
+        ).exclude(source_id='').values_list('source_id', 'post_id'))
+        return True
+
+    def lookup(self, model, lookup, names, cache):
+        for chunk in chunked(names):
+            cache.update(model.objects.filter(
+                **{f'{lookup}__in': chunk}
+            ).values_list(lookup, 'pk'))
+
+    def resolve(self, model, lookup, names, cache, build):
+        missing = names - cache.keys()
+        if not missing:
+            return
+        self.lookup(model, lookup, missing, cache)
+        missing -= cache.keys()
+        if missing and self.create_missing:
+            model.objects.bulk_create(
+                [build(name) for name in missing], ignore_conflicts=True
+            )
+            self.lookup(model, lookup, missing, cache)
+
+    def resolve_lookups(self, rows):
+        def new_user(username):
+            user = User(username=username)
+            user.set_unusable_password()
+            return user
+
+        usernames = {row.get('author') or self.default_author for row in rows}
+        self.resolve(
+            User, 'username', usernames - {None}, self.authors, new_user
+        )
+        self.resolve(
+            Group, 'slug',
+            {row.get('group') for row in rows} - {None, ''},
+            self.groups,
+            lambda slug: Group(slug=slug, title=slug, description=''),
+        )
+
+    def parse(self, number, row):
+        """Разобрать строку; ``None`` — строку надо пропустить."""
+        author_id = self.authors.get(row.get('author') or self.default_author)
+        kind = row.get('kind') or 'post'
+        if author_id is None or kind not in ('post', 'comment'):
+            return None
+        try:
+            text = row['text']
+            pub_date = parse_date(row.get('pub_date'))
+        except KeyError as error:
+            raise ImportRowError(number, f'нет поля {error}')
+        except ValueError as error:
+            raise ImportRowError(number, error)
+        if kind == 'comment':
+            return kind, str(row.get('post') or ''), Comment(
+                author_id=author_id, text=text, created=pub_date,
+            )
+        return kind, str(row.get('id') or ''), Post(
+            author_id=author_id,
+            group_id=self.groups.get(row.get('group') or None),
+            text=text,
+            image=row.get('image') or '',
+            pub_date=pub_date,
+        )
+
+    def import_batch(self, rows):
+        self.resolve_lookups(rows)
+        posts = []
+        comment_rows = []
+        for number, row in enumerate(rows, self.done + 1):
+            parsed = self.parse(number, row)
+            if parsed is None:
+                self.skipped += 1
+            elif parsed[0] == 'comment':
+                comment_rows.append(parsed[1:])
+            else:
+                posts.append(parsed[1:])
+        with transaction.atomic():
+            bulk_create_dated(Post, [post for _, post in posts])
+            ImportedPost.objects.bulk_create(
+                ImportedPost(run_id=self.name, source_id=source_id, post=post)
+                for source_id, post in posts
+            )
+            images = Counter(post.image.name for _, post in posts)
+            for name, number in images.items():
+                media.acquire(name, number)
+            for _, post in posts:
+                thumbnails.enqueue(post)
+            post_ids = {
+                source_id: post.pk for source_id, post in posts if source_id
+            }
+            comments = []
+            for source_id, comment in comment_rows:
+                comment.post_id = post_ids.get(
+                    source_id, self.post_ids.get(source_id)
+                )
+                if comment.post_id is None:
+                    self.skipped += 1
+                    continue
+                comments.append(comment)
+            bulk_create_dated(Comment, comments)
+            ImportRun.objects.filter(name=self.name).update(
+                done=self.done + len(rows)
+            )
+        self.done += len(rows)
+        self.post_ids.update(post_ids)
+        self.posts += len(posts)
+        self.comments += len(comments)
+
+    def run(self, rows):
+        rows = islice(rows, self.done, None)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+        self.finish()
+        ImportRun.objects.filter(name=self.name).delete()
+
+    def finish(self):
+        """Пересчитать производные данные один раз за весь импорт.
+
+        Ленты не пересобираются по одной: новые посты раскладываются
+        подписчикам пачками и ленты обрезаются одним запросом.
+        """
+        imported = ImportedPost.objects.filter(run_id=self.name)
+        posts = Post.objects.filter(pk__in=imported.values('post_id'))
+        author_ids = sorted(
+            set(posts.values_list('author_id', flat=True))
+            | set(Comment.objects.filter(
+                post__in=posts
+            ).values_list('author_id', flat=True))
+        )
+        slugs = sorted(set(posts.exclude(group=None).values_list(
+            'group__slug', flat=True
+        )))
+        for chunk in chunked(author_ids):
+            stats.recount(chunk)
+        followers = Follow.objects.filter(
+            author_id__in=posts.values('author_id')
+        ).values('user_id')
+        timeline.fan_out_many(posts)
+        timeline.trim_many(followers)
+        follower_ids = followers.distinct().values_list('user_id', flat=True)
+        bump_tags([
+            'feed:index',
+            *(f'author:{author_id}' for author_id in author_ids),
+            *(f'group:{slug}' for slug in slugs),
+            *(f'timeline:{user_id}' for user_id in follower_ids.iterator()),
+        ])
+        autocomplete.reload()
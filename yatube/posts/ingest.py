@@ -0,0 +1,173 @@
+import multiprocessing
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageOps, ImageSequence, UnidentifiedImageError
+
+# Во что сохраняется картинка каждого формата: формат и имя файла
+# не меняются, меняются только размер, метаданные и кодирование.
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 85, 'method': 4},
+    'GIF': {'optimize': True},
+}
+MODES = {'JPEG': ('RGB', 'L'), 'GIF': ('P', 'L')}
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+class IngestError(ValueError):
+    """Картинку нельзя принять; текст показывается пользователю."""
+
+
+def normalize(data, max_pixels, max_edge):
+    """Проверить, развернуть, уменьшить и перекодировать картинку.
+
+    Выполняется в процессе пула и не трогает Django. Размер в пикселях
+    проверяется по заголовку до декодирования; EXIF убирается, но
+    поворот из него применяется к пикселям; цветовой профиль
+    сохраняется. Возвращает байты картинки в исходном формате.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            return _normalize(data, max_pixels, max_edge)
+        except (Image.DecompressionBombError,
+                Image.DecompressionBombWarning):
+            raise IngestError('Картинка слишком большая.')
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            raise IngestError('Файл повреждён или не является картинкой.')
+
+
+def _normalize(data, max_pixels, max_edge):
+    image = Image.open(BytesIO(data))
+    image_format = 'JPEG' if image.format == 'MPO' else image.format
+    if image_format not in SAVE_OPTIONS:
+        raise IngestError(f'Формат {image.format} не поддерживается.')
+    width, height = image.size
+    if width * height > max_pixels:
+        raise IngestError(
+            f'Картинка {width}×{height} больше '
+            f'{max_pixels / 1_000_000:g} Мп.'
+        )
+    if getattr(image, 'is_animated', False):
+        return _normalize_animation(image, image_format, max_pixels, max_edge)
+    image.draft(image.mode, (max_edge, max_edge))
+    icc_profile = image.info.get('icc_profile')
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    allowed = MODES.get(image_format)
+    if allowed and image.mode not in allowed:
+        image = image.convert(allowed[0])
+    options = dict(SAVE_OPTIONS[image_format])
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    output = BytesIO()
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def _normalize_animation(image, image_format, max_pixels, max_edge):
+    """Анимированные GIF и WEBP: уменьшается каждый кадр.
+
+    Лимит пикселей считается по всем кадрам; длительности кадров и
+    число повторов сохраняются.
+    """
+    width, height = image.size
+    if width * height * image.n_frames > max_pixels:
+        raise IngestError(
+            f'Анимация {width}×{height} из {image.n_frames} кадров больше '
+            f'{max_pixels / 1_000_000:g} Мп.'
+        )
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 100))
+        frame = frame.convert('RGBA')
+        frame.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        frames.append(frame)
+    options = dict(SAVE_OPTIONS[image_format])
+    if 'loop' in image.info:
+        options['loop'] = image.info['loop']
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    output = BytesIO()
+    frames[0].save(
+        output, image_format, save_all=True, append_images=frames[1:],
+        duration=durations, **options
+    )
+    return output.getvalue()
+
+
+def executor():
+    """Пул процессов и семафор его очереди; создаются при первой загрузке.
+
+    Процессы стартуют через ``spawn``: ``fork`` из многопоточного
+    сервера может унаследовать захваченные блокировки.
+    """
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            workers = settings.IMAGE_INGEST_WORKERS
+            _executor = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('spawn')
+            )
+            _slots = threading.BoundedSemaphore(workers * 2)
+        return _executor, _slots
+
+
+def reset(pool):
+    """Выбросить сломанный пул (например, воркер убит по памяти)."""
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is pool:
+            _executor = None
+            _slots = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def check_size(size):
+    if size > settings.IMAGE_MAX_BYTES:
+        raise IngestError(
+            f'Файл больше {settings.IMAGE_MAX_BYTES // 2**20} МБ.'
+        )
+
+
+def ingest(data):
+    """Нормализовать загруженную картинку с лимитами из настроек.
+
+    Очередь к пулу ограничена: место занято, пока воркер не закончит
+    картинку, даже если запрос уже перестал её ждать; если все места
+    заняты дольше ``IMAGE_INGEST_TIMEOUT`` секунд, загрузка отклоняется,
+    а не копится в памяти. С ``IMAGE_INGEST_WORKERS = 0`` работа идёт
+    в этом процессе.
+    """
+    check_size(len(data))
+    arguments = (data, settings.IMAGE_MAX_PIXELS, settings.IMAGE_MAX_EDGE)
+    if not settings.IMAGE_INGEST_WORKERS:
+        return normalize(*arguments)
+    pool, slots = executor()
+    timeout = settings.IMAGE_INGEST_TIMEOUT
+    if not slots.acquire(timeout=timeout):
+        raise IngestError('Сервер перегружен, попробуйте позже.')
+    try:
+        future = pool.submit(normalize, *arguments)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda future: slots.release())
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        raise IngestError('Картинка обрабатывается слишком долго.')
+    except BrokenProcessPool:
+        reset(pool)
+        raise IngestError('Не удалось обработать картинку.')
@@ -0,0 +1,69 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from sorl.thumbnail import default
+
+from posts.models import Post
+from posts.thumbnails import generate, source
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры всех картинок постов в несколько потоков. '
+        'Кэш страниц не сбрасывается: заглушки уйдут вместе с ним.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число потоков (по умолчанию — число ядер).',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Удалить готовые миниатюры и создать их заново.',
+        )
+
+    def handle(self, *args, **options):
+        force = options['force']
+
+        def task(name):
+            try:
+                if force:
+                    default.kvstore.delete_thumbnails(source(name))
+                generate(name)
+            finally:
+                connections.close_all()
+
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        started = time.monotonic()
+        done = failed = 0
+        workers = max(options['workers'], 1)
+        with ThreadPoolExecutor(workers) as executor:
+            running = set()
+            for name in names.iterator():
+                if len(running) >= workers * 4:
+                    finished, running = wait(
+                        running, return_when=FIRST_COMPLETED
+                    )
+                    done, failed = self.report(finished, done, failed)
+                running.add(executor.submit(task, name))
+            done, failed = self.report(wait(running).done, done, failed)
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры: {done} картинок за '
+            f'{time.monotonic() - started:.1f} с, ошибок {failed}'
+        ))
+
+    def report(self, finished, done, failed):
+        for future in finished:
+            error = future.exception()
+            if error is None:
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f'Ошибка: {error}')
+        return done, failed
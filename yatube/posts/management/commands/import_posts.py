@@ -0,0 +1,70 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.imports import (
+    BATCH_SIZE, FORMATS, ImportRowError, Importer, read_rows
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты и комментарии из NDJSON или CSV '
+        '(формат команды export_posts).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=FORMATS, dest='import_format',
+            help='Формат файла; по умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--author',
+            help='Автор для строк без колонки author.',
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать отсутствующих авторов и группы.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Имя, под которым прогресс хранится в базе; по умолчанию '
+                 'полный путь к файлу.',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить прерванный импорт с сохранённого места.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден')
+        import_format = options['import_format'] or (
+            'csv' if '.csv' in os.path.basename(path) else 'ndjson'
+        )
+        importer = Importer(
+            options['checkpoint'] or os.path.abspath(path),
+            default_author=options['author'],
+            create_missing=options['create_missing'],
+            batch_size=options['batch_size'],
+        )
+        if options['resume'] and importer.resume():
+            self.stdout.write(f'Продолжение со строки {importer.done}')
+        else:
+            importer.start()
+        try:
+            importer.run(read_rows(path, import_format))
+        except ImportRowError as error:
+            raise CommandError(
+                f'{error}. Импортировано строк: {importer.done}; '
+                f'продолжить можно с --resume.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов: {importer.posts}, комментариев: {importer.comments}, '
+            f'пропущено строк: {importer.skipped}'
+        ))
@@ -0,0 +1,78 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core.cache import bump_tags
+from posts import media
+from posts.models import Post
+from posts.signals import post_tags
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище с именами по хэшу '
+        'содержимого и пересчитывает ссылки на файлы. Можно прервать '
+        'и запустить снова: перенесённые файлы пропускаются. Миниатюры '
+        'создаются заново при показе или командой generate_thumbnails.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Сколько файлов переносить в одной транзакции.',
+        )
+        parser.add_argument(
+            '--keep-originals', action='store_true',
+            help='Не удалять старые файлы после переноса.',
+        )
+
+    def handle(self, *args, **options):
+        storage = media.storage()
+        batch_size = max(options['batch_size'], 1)
+        moved = missing = 0
+        last = ''
+        while True:
+            names = list(Post.objects.exclude(image='').filter(
+                image__gt=last
+            ).order_by('image').values_list('image', flat=True).distinct()[
+                :batch_size
+            ])
+            if not names:
+                break
+            last = names[-1]
+            renames = {}
+            for name in names:
+                if storage.is_hashed(name):
+                    continue
+                if not storage.exists(name):
+                    missing += 1
+                    self.stderr.write(f'Нет файла: {name}')
+                    continue
+                with storage.open(name) as original:
+                    renames[name] = storage.save(name, File(original))
+            if renames:
+                self.migrate_batch(renames, options['keep_originals'])
+                moved += len(renames)
+                self.stdout.write(f'Перенесено файлов: {moved}')
+        files = media.recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {moved}, не найдено: {missing}, '
+            f'уникальных файлов: {files}'
+        ))
+
+    def migrate_batch(self, renames, keep_originals):
+        posts = list(Post.objects.filter(image__in=renames).only(
+            'pk', 'author_id', 'group_id'
+        ))
+        with transaction.atomic():
+            for old, new in renames.items():
+                Post.objects.filter(image=old).update(image=new)
+        storage = media.storage()
+        for old in renames:
+            default.backend.delete(
+                ImageFile(old, storage), delete_file=not keep_originals
+            )
+        for post in posts:
+            bump_tags(post_tags(post))
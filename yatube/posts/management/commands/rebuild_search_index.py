@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.search import SEARCH_TABLE
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов (SQLite FTS5).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--optimize', action='store_true',
+            help='После пересборки слить сегменты индекса.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Индекс FTS5 есть только в SQLite.')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) "
+                f"VALUES ('rebuild')"
+            )
+            if options['optimize']:
+                cursor.execute(
+                    f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) "
+                    f"VALUES ('optimize')"
+                )
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import User
+from posts.stats import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованную статистику авторов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Пересчитать только этих пользователей.',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = list(User.objects.filter(
+                username__in=options['usernames']
+            ).values_list('pk', flat=True))
+        updated = recount(user_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано авторов: {updated}')
+        )
@@ -0,0 +1,127 @@
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import Count, F
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import MediaFile, Post
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def storage():
+    return Post._meta.get_field('image').storage
+
+
+def acquire(name, number=1):
+    """Учесть ещё ``number`` ссылок на файл.
+
+    Строка блокируется (``select_for_update``): если ``remove`` как раз
+    удаляет файл, ссылка берётся после него и файл пишется заново.
+    """
+    if not name:
+        return
+    with transaction.atomic():
+        MediaFile.objects.select_for_update().get_or_create(name=name)
+        MediaFile.objects.filter(name=name).update(refs=F('refs') + number)
+
+
+def acquire_upload(image):
+    """Взять ссылку на ещё не записанный файл; возвращает его имя.
+
+    Вызывается до записи: хранилище не пишет файл, который уже есть,
+    и ссылка должна появиться раньше, чем оно это решит.
+    """
+    if not image or image._committed:
+        return None
+    name = image.field.generate_filename(image.instance, image.name)
+    name = storage().content_name(name, image.file)
+    acquire(name)
+    return name
+
+
+def release(name):
+    """Снять ссылку; файл без ссылок удаляется после коммита.
+
+    Файлы, которых нет в учёте (например, загруженные до него и ещё не
+    пересчитанные ``migrate_media``), никогда не удаляются.
+    """
+    if not name:
+        return
+    MediaFile.objects.filter(name=name, refs__gt=0).update(
+        refs=F('refs') - 1
+    )
+    if MediaFile.objects.filter(name=name, refs=0).exists():
+        transaction.on_commit(lambda: remove(name))
+
+
+def is_stored(name):
+    """Лежит ли файл внутри хранилища (старые записи бывают абсолютными)."""
+    try:
+        storage().path(name)
+    except (SuspiciousFileOperation, ValueError):
+        return False
+    return True
+
+
+def remove(name):
+    """Удалить файл без ссылок вместе с его миниатюрами.
+
+    Строка учёта и файл удаляются в одной транзакции, так что
+    ``acquire`` того же файла либо ждёт её, либо успевает раньше —
+    тогда строки с нулём ссылок уже нет и файл остаётся. Ошибка
+    хранилища только пишется в журнал: пост к этому времени сохранён.
+    """
+    with transaction.atomic():
+        if not MediaFile.objects.filter(name=name, refs=0).delete()[0]:
+            return
+        if not is_stored(name):
+            logger.warning('Файл вне хранилища не удаляется: %s', name)
+            return
+        try:
+            default.backend.delete(ImageFile(name, storage()))
+        except (SuspiciousFileOperation, OSError):
+            logger.exception('Не удалось удалить файл %s', name)
+
+
+def recount():
+    """Пересчитать ссылки по таблице постов; возвращает число файлов.
+
+    Подсчёт и запись идут в одной транзакции под блокировкой строк
+    учёта, а таблица не очищается: меняются только разошедшиеся строки,
+    и удаляются строки файлов, на которые не ссылается ни один пост.
+    Сами файлы при этом не удаляются.
+    """
+    with transaction.atomic():
+        current = dict(MediaFile.objects.select_for_update().values_list(
+            'name', 'refs'
+        ).iterator())
+        counted = dict(Post.objects.exclude(image='').order_by().values(
+            'image'
+        ).annotate(refs=Count('pk')).values_list('image', 'refs').iterator())
+        MediaFile.objects.bulk_create(
+            [
+                MediaFile(name=name, refs=refs)
+                for name, refs in counted.items() if name not in current
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        MediaFile.objects.bulk_update(
+            [
+                MediaFile(name=name, refs=refs)
+                for name, refs in counted.items()
+                if name in current and current[name] != refs
+            ],
+            ['refs'],
+            batch_size=BATCH_SIZE,
+        )
+        unused = [name for name in current if name not in counted]
+        for start in range(0, len(unused), BATCH_SIZE):
+            MediaFile.objects.filter(
+                name__in=unused[start:start + BATCH_SIZE]
+            ).delete()
+    return len(counted)
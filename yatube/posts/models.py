@@ -1,6 +1,12 @@
+import os
+import secrets
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -54,11 +60,31 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_placeholder = models.TextField(
+        'Размытое превью картинки',
+        blank=True,
+        editable=False,
+        help_text='data: URI крошечной копии, пока грузится миниатюра'
+    )
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+        ]
         verbose_name_plural = 'Посты'
         verbose_name = 'Пост'
 
@@ -118,3 +144,166 @@ class Follow(models.Model):
         ]
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date', '-post_id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'], name='timeline_user_author_idx'
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class AuthorStats(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписок'
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0, verbose_name='Комментариев'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return f'{self.author_id}: {self.posts_count}'
+
+
+class ImportRun(models.Model):
+    """Прогресс прерываемого импорта (см. ``posts.imports``)."""
+
+    name = models.CharField('Импорт', primary_key=True, max_length=255)
+    done = models.PositiveBigIntegerField('Обработано строк', default=0)
+    started = models.DateTimeField('Начат', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Импорт'
+        verbose_name_plural = 'Импорты'
+
+    def __str__(self):
+        return f'{self.name}: {self.done}'
+
+
+class ImportedPost(models.Model):
+    """Пост, созданный импортом, и его id в источнике."""
+
+    run = models.ForeignKey(
+        ImportRun,
+        on_delete=models.CASCADE,
+        related_name='posts',
+        verbose_name='Импорт',
+    )
+    source_id = models.CharField('Id в источнике', max_length=64, blank=True)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост',
+    )
+
+    class Meta:
+        verbose_name = 'Импортированный пост'
+        verbose_name_plural = 'Импортированные посты'
+
+    def __str__(self):
+        return f'{self.source_id} → {self.post_id}'
+
+
+def new_upload_token():
+    return secrets.token_urlsafe(24)
+
+
+class Upload(models.Model):
+    """Картинка, которая загружается по частям (см. ``posts.uploads``)."""
+
+    token = models.CharField(
+        primary_key=True,
+        max_length=32,
+        default=new_upload_token,
+        editable=False,
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='uploads',
+        verbose_name='Пользователь',
+    )
+    filename = models.CharField('Имя файла', max_length=255)
+    size = models.PositiveBigIntegerField('Размер')
+    sha256 = models.CharField('SHA-256', max_length=64)
+    received = models.PositiveBigIntegerField('Получено байт', default=0)
+    complete = models.BooleanField('Проверена', default=False)
+    created = models.DateTimeField('Начата', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Загрузка'
+        verbose_name_plural = 'Загрузки'
+
+    def __str__(self):
+        return f'{self.filename}: {self.received}/{self.size}'
+
+    @property
+    def path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{self.token}.part')
+
+
+class MediaFile(models.Model):
+    """Сколько постов ссылаются на файл (см. ``posts.media``)."""
+
+    name = models.CharField('Имя файла', primary_key=True, max_length=255)
+    refs = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return f'{self.name}: {self.refs}'
@@ -0,0 +1,288 @@
+import base64
+import hashlib
+from datetime import datetime
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def encode_cursor(pub_date, pk):
+    value = f'{pub_date.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(value).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Вернуть пару (pub_date, id) или ValueError для битого курсора."""
+    pub_date, pk = _split_cursor(cursor)
+    return datetime.fromisoformat(pub_date), int(pk)
+
+
+def encode_score_cursor(score, pk):
+    value = f'{score!r}|{pk}'.encode()
+    return base64.urlsafe_b64encode(value).decode().rstrip('=')
+
+
+def decode_score_cursor(cursor):
+    """Вернуть пару (score, id) или ValueError для битого курсора."""
+    score, pk = _split_cursor(cursor)
+    return float(score), int(pk)
+
+
+def _split_cursor(cursor):
+    padding = '=' * (-len(cursor) % 4)
+    value = base64.urlsafe_b64decode(cursor + padding).decode()
+    return value.split('|')
+
+
+class CursorPage(Page):
+    """Страница курсорного пагинатора.
+
+    Совместима с шаблонным контрактом ``page_obj``: итерируется,
+    поддерживает ``len`` и ``has_next``/``has_previous``, а ссылки
+    строятся по ``next_cursor`` (старше) и ``previous_cursor`` (новее).
+    """
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage {self.previous_cursor}..{self.next_cursor}>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по паре ``(pub_date, id)`` от новых к старым.
+
+    Каждая страница читается одним запросом ``LIMIT per_page + 1``
+    по индексу, без ``COUNT(*)`` и ``OFFSET``, поэтому стоимость не зависит
+    от глубины, а вставка новых постов не сдвигает уже выданные страницы.
+    ``keys`` позволяет пагинировать таблицы, где ключ хранится под другими
+    именами (например, ``('pub_date', 'post_id')``).
+    """
+
+    is_cursor = True
+    encode = staticmethod(encode_cursor)
+    decode = staticmethod(decode_cursor)
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'id')):
+        self.keys = keys
+        date_key, id_key = keys
+        super().__init__(
+            object_list.order_by(f'-{date_key}', f'-{id_key}'), per_page
+        )
+
+    def _position(self, row):
+        date_key, id_key = self.keys
+        return self.encode(getattr(row, date_key), getattr(row, id_key))
+
+    def _older_than(self, pub_date, pk):
+        date_key, id_key = self.keys
+        return Q(**{f'{date_key}__lte': pub_date}) & (
+            Q(**{f'{date_key}__lt': pub_date}) | Q(**{f'{id_key}__lt': pk})
+        )
+
+    def _newer_than(self, pub_date, pk):
+        date_key, id_key = self.keys
+        return Q(**{f'{date_key}__gte': pub_date}) & (
+            Q(**{f'{date_key}__gt': pub_date}) | Q(**{f'{id_key}__gt': pk})
+        )
+
+    def first_page(self):
+        rows = list(self.object_list[:self.per_page + 1])
+        return self._page(rows, has_next=len(rows) > self.per_page)
+
+    def older_page(self, pub_date, pk):
+        rows = list(
+            self.object_list.filter(
+                self._older_than(pub_date, pk)
+            )[:self.per_page + 1]
+        )
+        return self._page(
+            rows, has_next=len(rows) > self.per_page, has_previous=True
+        )
+
+    def newer_page(self, pub_date, pk):
+        date_key, id_key = self.keys
+        rows = list(
+            self.object_list.filter(
+                self._newer_than(pub_date, pk)
+            ).order_by(date_key, id_key)[:self.per_page + 1]
+        )
+        if len(rows) <= self.per_page:
+            return self.first_page()
+        rows = rows[:self.per_page][::-1]
+        return self._page(rows, has_next=True, has_previous=True)
+
+    def _page(self, rows, has_next, has_previous=False):
+        rows = rows[:self.per_page]
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self._position(rows[-1])
+        if rows and has_previous:
+            previous_cursor = self._position(rows[0])
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def get_cursor_page(self, before=None, after=None):
+        """Вернуть страницу старше ``before`` или новее ``after``.
+
+        Как и ``Paginator.get_page``, не падает на некорректном вводе:
+        битый курсор отдаёт первую страницу.
+        """
+        try:
+            if before:
+                return self.older_page(*self.decode(before))
+            if after:
+                return self.newer_page(*self.decode(after))
+        except ValueError:
+            pass
+        return self.first_page()
+
+
+class ScoreCursorPaginator(CursorPaginator):
+    """Курсорная пагинация результатов поиска по ``(score, id)``.
+
+    ``score`` — аннотация релевантности (больше — выше в выдаче); в курсор
+    она пишется через ``repr``, так что граница страницы точна.
+    """
+
+    encode = staticmethod(encode_score_cursor)
+    decode = staticmethod(decode_score_cursor)
+
+    def __init__(self, object_list, per_page, keys=('score', 'id')):
+        super().__init__(object_list, per_page, keys)
+
+
+class ExactCount:
+    def __call__(self, object_list):
+        return object_list.count()
+
+
+class CachedCount:
+    """Точный ``COUNT(*)``, закэшированный на ``timeout`` секунд."""
+
+    def __init__(self, timeout=60):
+        self.timeout = timeout
+
+    @staticmethod
+    def key(object_list):
+        """Ключ по модели, SQL и параметрам запроса.
+
+        ``str(query)`` подставляет параметры без кавычек, и разные выборки
+        могут дать одну строку; ``sql_with_params`` их не смешивает.
+        """
+        sql, params = object_list.query.sql_with_params()
+        query = repr((object_list.model._meta.label, sql, params)).encode()
+        return f'paginator_count:{hashlib.md5(query).hexdigest()}'
+
+    def __call__(self, object_list):
+        return cache.get_or_set(
+            self.key(object_list), object_list.count, self.timeout
+        )
+
+
+class EstimatedCount:
+    """Оценка числа строк по статистике таблицы.
+
+    Работает только для нефильтрованных выборок; для остальных, а также
+    если статистики нет (не выполнялся ``ANALYZE``), используется
+    ``fallback``.
+    """
+
+    queries = {
+        'sqlite': (
+            'SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 '
+            'WHERE tbl = %s LIMIT 1'
+        ),
+        'postgresql': (
+            'SELECT reltuples::bigint FROM pg_class '
+            'WHERE oid = %s::regclass'
+        ),
+    }
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback or CachedCount()
+
+    def estimate(self, object_list):
+        connection = connections[object_list.db]
+        sql = self.queries.get(connection.vendor)
+        if sql is None or object_list.query.where:
+            return None
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [object_list.model._meta.db_table])
+                row = cursor.fetchone()
+        except DatabaseError:
+            return None
+        if row is None or row[0] is None or row[0] < 0:
+            return None
+        return row[0]
+
+    def __call__(self, object_list):
+        count = self.estimate(object_list)
+        if count is None:
+            return self.fallback(object_list)
+        return count
+
+
+COUNT_STRATEGIES = {
+    'exact': ExactCount,
+    'cached': CachedCount,
+    'estimated': EstimatedCount,
+}
+
+
+class ApproximatePaginator(Paginator):
+    """Пагинатор с подменяемым подсчётом и ограничением числа страниц.
+
+    ``count_strategy`` вызывается с исходной выборкой и возвращает число
+    объектов (точное, кэшированное или оценочное), а ``max_pages``
+    ограничивает глубину ``OFFSET``: страницы дальше последней разрешённой
+    отдаются как последняя.
+    """
+
+    def __init__(
+        self, object_list, per_page, count_strategy=None, max_pages=None,
+        **kwargs
+    ):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_strategy = count_strategy or ExactCount()
+        self.max_pages = max_pages
+
+    @cached_property
+    def count(self):
+        return self.count_strategy(self.object_list)
+
+    @cached_property
+    def num_pages(self):
+        num_pages = super().num_pages
+        if self.max_pages is not None:
+            return min(num_pages, self.max_pages)
+        return num_pages
+
+    def page(self, number):
+        # Срез не обрезается по count: оценка или закэшированное число
+        # может отставать, и свежие посты не должны пропадать со страницы.
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+    def get_page(self, number):
+        # Обычный Page, а не подкласс: вызывающий код и шаблоны
+        # рассчитывают именно на него.
+        page = super().get_page(number)
+        page.elided_page_range = self.get_elided_page_range(
+            page.number, on_each_side=2, on_ends=1
+        )
+        return page
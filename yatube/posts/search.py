@@ -0,0 +1,144 @@
+import re
+
+from django.db import connection, connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+SEARCH_TABLE = 'posts_post_fts'
+MAX_TERMS = 10
+SNIPPET_TOKENS = 24
+MARK_START = '\x01'
+MARK_END = '\x02'
+
+WORD = re.compile(r'\w+')
+
+# Индекс внешнего содержимого держится в синхронизации триггерами на
+# posts_post. SQLite теряет их, когда Django пересоздаёт таблицу при
+# изменении схемы, поэтому после каждого ``migrate`` их возвращает
+# ``restore_triggers``.
+TRIGGERS = {
+    'posts_post_fts_insert': """
+        CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO posts_post_fts (rowid, text)
+            VALUES (new.id, new.text);
+        END
+    """,
+    'posts_post_fts_delete': """
+        CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO posts_post_fts (posts_post_fts, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END
+    """,
+    'posts_post_fts_update': """
+        CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO posts_post_fts (posts_post_fts, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO posts_post_fts (rowid, text)
+            VALUES (new.id, new.text);
+        END
+    """,
+}
+
+
+def restore_triggers(using='default', **kwargs):
+    """Вернуть пропавшие триггеры индекса и пересобрать его.
+
+    Обработчик ``post_migrate``: посты, изменённые, пока триггеров не
+    было, в индекс не попали, поэтому он пересобирается целиком.
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        if SEARCH_TABLE not in db.introspection.table_names(cursor):
+            return
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = 'posts_post'"
+        )
+        missing = set(TRIGGERS) - {name for name, in cursor.fetchall()}
+        if not missing:
+            return
+        for name in sorted(missing):
+            cursor.execute(TRIGGERS[name])
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def terms(query):
+    return WORD.findall(query.lower())[:MAX_TERMS]
+
+
+def match_expression(query):
+    """Запрос FTS5 из пользовательской строки.
+
+    Берутся только слова, каждое в кавычках и с ``*``: операторы FTS5
+    из ввода не исполняются, а «прив» находит «привет».
+    """
+    return ' '.join(f'"{term}"*' for term in terms(query))
+
+
+def search_posts(query, group=None, author=None):
+    """Посты под запрос, от релевантных к менее релевантным.
+
+    У каждого поста есть аннотации ``score`` и ``snippet``.
+
+    В SQLite используется индекс FTS5 (миграция ``0013_post_search``):
+    ``score`` — это ``-bm25``, чем больше, тем релевантнее. В других базах
+    поиск откатывается на ``icontains`` с нулевым ``score``.
+    """
+    posts = Post.objects.select_related('author', 'group')
+    if group:
+        posts = posts.filter(group__slug=group)
+    if author:
+        posts = posts.filter(author__username=author)
+    expression = match_expression(query)
+    if not expression:
+        return posts.none()
+    if connection.vendor != 'sqlite':
+        condition = Q()
+        for term in terms(query):
+            condition &= Q(text__icontains=term)
+        return posts.filter(condition).annotate(
+            score=Value(0.0, output_field=FloatField()),
+            snippet=RawSQL('substr(posts_post.text, 1, 200)', ()),
+        ).order_by('-score', '-id')
+    return posts.extra(
+        tables=[SEARCH_TABLE],
+        where=[
+            f'{SEARCH_TABLE}.rowid = posts_post.id',
+            f'{SEARCH_TABLE} MATCH %s',
+        ],
+        params=[expression],
+    ).annotate(
+        score=RawSQL(f'-bm25({SEARCH_TABLE})', (), FloatField()),
+        snippet=RawSQL(
+            f"snippet({SEARCH_TABLE}, 0, %s, %s, '…', %s)",
+            (MARK_START, MARK_END, SNIPPET_TOKENS),
+        ),
+    ).order_by('-score', '-id')
+
+
+def highlight(snippet):
+    """Экранированный фрагмент с найденными словами в ``<mark>``."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def matching_ids(query):
+    """Подзапрос id постов под запрос — для фильтра ``pk__in``."""
+    return RawSQL(
+        f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+        (match_expression(query),),
+    )
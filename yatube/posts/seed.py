@@ -0,0 +1,262 @@
+import random
+import time
+from array import array
+from datetime import datetime, timezone
+from multiprocessing import Pool
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from faker import Faker
+
+from . import autocomplete, stats, timeline
+from .imports import bulk_create_dated
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 5000
+DAY = 24 * 60 * 60
+SENTENCES = 2000
+
+_context = {}
+
+
+def random_text(rnd, max_sentences, limit=400):
+    """Текст из заранее созданных предложений: в сотню раз быстрее
+    ``fake.text()``."""
+    sentences = rnd.choices(
+        _context['sentences'], k=rnd.randint(1, max_sentences)
+    )
+    return ' '.join(sentences)[:limit]
+
+
+def skewed(rnd, count, power):
+    """Индекс из ``[0, count)`` по степенному закону.
+
+    Чем больше ``power``, тем сильнее перекос к малым индексам: при
+    ``power=3`` первый 1% индексов выпадает примерно в пятой части случаев.
+    """
+    return int(count * rnd.random() ** power)
+
+
+def bursty_timestamp(rnd):
+    """Время публикации: фоновый поток плюс всплески вокруг «событий»."""
+    start, span = _context['start'], _context['span']
+    if rnd.random() < 0.6:
+        burst = rnd.choice(_context['bursts'])
+        timestamp = burst + rnd.expovariate(1 / 21600)
+    else:
+        timestamp = start + rnd.random() * span
+    return min(timestamp, start + span)
+
+
+def user_rows(fake, rnd, start, size):
+    return [
+        (f'{fake.user_name()}_{index}', fake.first_name(), fake.last_name())
+        for index in range(start, start + size)
+    ]
+
+
+def group_rows(fake, rnd, start, size):
+    return [
+        (
+            fake.sentence(nb_words=3).rstrip('.'),
+            f'group-{index}',
+            fake.paragraph(),
+        )
+        for index in range(start, start + size)
+    ]
+
+
+def post_rows(fake, rnd, start, size):
+    users, groups = _context['users'], _context['groups']
+    return [
+        (
+            skewed(rnd, users, 2),
+            skewed(rnd, groups, 2) if groups and rnd.random() < 0.7 else None,
+            random_text(rnd, 8),
+            bursty_timestamp(rnd),
+        )
+        for _ in range(size)
+    ]
+
+
+def comment_rows(fake, rnd, start, size):
+    users, posts = _context['users'], _context['posts']
+    return [
+        (
+            skewed(rnd, posts, 3),
+            rnd.randrange(users),
+            random_text(rnd, 2),
+            rnd.expovariate(1 / 3600),
+        )
+        for _ in range(size)
+    ]
+
+
+def follow_rows(fake, rnd, start, size):
+    users = _context['users']
+    return [
+        (rnd.randrange(users), skewed(rnd, users, 3)) for _ in range(size)
+    ]
+
+
+GENERATORS = {
+    'users': user_rows,
+    'groups': group_rows,
+    'posts': post_rows,
+    'comments': comment_rows,
+    'follows': follow_rows,
+}
+
+
+def init_worker(context):
+    _context.update(context)
+    fake = Faker('ru_RU')
+    fake.seed_instance(context['seed'])
+    _context['sentences'] = [fake.sentence() for _ in range(SENTENCES)]
+
+
+def generate(task):
+    """Сгенерировать одну пачку строк; выполняется в процессе пула."""
+    kind, start, size = task
+    seed = f'{_context["seed"]}:{kind}:{start}'
+    if 'fake' not in _context:
+        _context['fake'] = Faker('ru_RU')
+    fake = _context['fake']
+    fake.seed_instance(seed)
+    return GENERATORS[kind](fake, random.Random(seed), start, size)
+
+
+class Seeder:
+    """Генератор синтетических данных масштаба продакшена.
+
+    Faker работает в пуле из ``workers`` процессов, а основной процесс
+    только превращает готовые строки в объекты и вставляет их
+    ``bulk_create`` пачками по ``batch_size``: у SQLite один писатель,
+    так что параллельная запись не ускорила бы вставку. Подписчики и
+    авторы распределены по степенному закону, популярные группы и посты
+    собирают большую часть записей и комментариев, даты публикаций
+    собраны во всплески.
+    """
+
+    def __init__(self, users, groups, posts, comments, follows, days=365,
+                 workers=None, batch_size=BATCH_SIZE, seed=0, log=print):
+        if not users:
+            posts = comments = follows = 0
+        if not posts:
+            comments = 0
+        self.counts = {
+            'users': users,
+            'groups': groups,
+            'posts': posts,
+            'comments': comments,
+            'follows': follows,
+        }
+        self.workers = workers
+        self.batch_size = batch_size
+        self.log = log
+        rnd = random.Random(seed)
+        now = time.time()
+        start = now - days * DAY
+        self.context = {
+            'seed': seed,
+            'start': start,
+            'span': now - start,
+            'bursts': [
+                start + rnd.random() * (now - start)
+                for _ in range(max(days // 7, 1))
+            ],
+            **self.counts,
+        }
+
+    def tasks(self, kind):
+        total = self.counts[kind]
+        return [
+            (kind, start, min(self.batch_size, total - start))
+            for start in range(0, total, self.batch_size)
+        ]
+
+    def insert(self, pool, kind, model, build, ignore_conflicts=False):
+        started = time.monotonic()
+        ids = array('q')
+        for rows in pool.imap(generate, self.tasks(kind)):
+            objects = [obj for obj in map(build, rows) if obj is not None]
+            created = bulk_create_dated(
+                model, objects, ignore_conflicts=ignore_conflicts
+            )
+            if not ignore_conflicts:
+                ids.extend(obj.pk for obj in created)
+        self.log(
+            f'{kind}: {self.counts[kind]} '
+            f'за {time.monotonic() - started:.1f} с'
+        )
+        return ids
+
+    def run(self, rebuild_timelines=True):
+        password = make_password('password')
+        with Pool(self.workers, init_worker, (self.context,)) as pool:
+            user_ids = self.insert(
+                pool, 'users', User,
+                lambda row: User(
+                    username=row[0], first_name=row[1], last_name=row[2],
+                    password=password,
+                ),
+            )
+            group_ids = self.insert(
+                pool, 'groups', Group,
+                lambda row: Group(
+                    title=row[0], slug=row[1], description=row[2]
+                ),
+            )
+            post_dates = array('d')
+
+            def build_post(row):
+                author, group, text, timestamp = row
+                post_dates.append(timestamp)
+                return Post(
+                    author_id=user_ids[author],
+                    group_id=None if group is None else group_ids[group],
+                    text=text,
+                    pub_date=datetime.fromtimestamp(timestamp, timezone.utc),
+                )
+
+            def build_comment(row):
+                post, author, text, delay = row
+                return Comment(
+                    post_id=post_ids[post],
+                    author_id=user_ids[author],
+                    text=text,
+                    created=datetime.fromtimestamp(
+                        min(post_dates[post] + delay, time.time()),
+                        timezone.utc,
+                    ),
+                )
+
+            def build_follow(row):
+                user, author = row
+                if user == author:
+                    return None
+                return Follow(
+                    user_id=user_ids[user], author_id=user_ids[author]
+                )
+
+            post_ids = self.insert(pool, 'posts', Post, build_post)
+            self.insert(pool, 'comments', Comment, build_comment)
+            self.insert(
+                pool, 'follows', Follow, build_follow, ignore_conflicts=True
+            )
+        self.finish(rebuild_timelines)
+
+    def finish(self, rebuild_timelines):
+        started = time.monotonic()
+        stats.recount()
+        if rebuild_timelines:
+            follower_ids = Follow.objects.values_list(
+                'user_id', flat=True
+            ).distinct().order_by('user_id')
+            for user_id in follower_ids.iterator():
+                timeline.rebuild(user_id)
+        cache.clear()
+        autocomplete.reload()
+        self.log(
+            f'Производные данные: {time.monotonic() - started:.1f} с'
+        )
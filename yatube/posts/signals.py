@@ -0,0 +1,144 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import bump_tags
+from . import autocomplete, media, stats, timeline, uploads
+from .models import AuthorStats, Comment, Follow, Group, Post, Upload, User
+
+
+def post_tags(post):
+    group_ids = {post.group_id, getattr(post, '_previous_group_id', None)}
+    slugs = Group.objects.filter(pk__in=group_ids - {None}).values_list(
+        'slug', flat=True
+    )
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    return [
+        'feed:index',
+        f'post:{post.pk}',
+        f'author:{post.author_id}',
+        *(f'group:{slug}' for slug in slugs),
+        *(f'timeline:{user_id}' for user_id in follower_ids.iterator()),
+    ]
+
+
+def follow_tags(follow):
+    return [
+        f'author:{follow.author_id}',
+        f'author:{follow.user_id}',
+        f'timeline:{follow.user_id}',
+    ]
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.get_or_create(author=instance)
+    update_fields = kwargs.get('update_fields')
+    if update_fields is None or 'username' in update_fields:
+        autocomplete.user_saved(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    autocomplete.user_deleted(instance)
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    if instance.pk:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image'
+        ).first()
+        if previous is not None:
+            instance._previous_group_id, instance._previous_image = previous
+    instance._acquired_image = media.acquire_upload(instance.image)
+
+
+def image_saved(instance, previous_image=None):
+    """Перенести ссылку на картинку с прежней на текущую.
+
+    Ссылка, взятая в ``pre_save`` до записи файла, засчитывается за
+    текущую; совпадающие имена не трогаются, чтобы счётчик не проходил
+    через ноль.
+    """
+    released = [previous_image, getattr(instance, '_acquired_image', None)]
+    instance._acquired_image = None
+    if instance.image.name in released:
+        released.remove(instance.image.name)
+    else:
+        media.acquire(instance.image.name)
+    for name in released:
+        media.release(name)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(instance.author_id, 'posts_count')
+        timeline.fan_out(instance)
+        autocomplete.group_posts_changed(instance.group_id, 1)
+        image_saved(instance)
+    else:
+        previous_group_id = getattr(instance, '_previous_group_id', None)
+        if previous_group_id != instance.group_id:
+            autocomplete.group_posts_changed(previous_group_id, -1)
+            autocomplete.group_posts_changed(instance.group_id, 1)
+        image_saved(instance, getattr(instance, '_previous_image', None))
+    bump_tags(post_tags(instance))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    stats.increment(instance.author_id, 'posts_count', -1)
+    autocomplete.group_posts_changed(instance.group_id, -1)
+    media.release(instance.image.name)
+    bump_tags(post_tags(instance))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(instance.author_id, 'followers_count')
+        stats.increment(instance.user_id, 'following_count')
+        timeline.backfill(instance.user_id, instance.author_id)
+        autocomplete.followers_changed(instance.author_id)
+        bump_tags(follow_tags(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    stats.increment(instance.author_id, 'followers_count', -1)
+    stats.increment(instance.user_id, 'following_count', -1)
+    timeline.remove(instance.user_id, instance.author_id)
+    autocomplete.followers_changed(instance.author_id)
+    bump_tags(follow_tags(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(instance.author_id, 'comments_count')
+    bump_tags([f'post:{instance.post_id}', f'author:{instance.author_id}'])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    stats.increment(instance.author_id, 'comments_count', -1)
+    bump_tags([f'post:{instance.post_id}', f'author:{instance.author_id}'])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    if kwargs['signal'] is post_save:
+        autocomplete.group_saved(instance)
+    else:
+        autocomplete.group_deleted(instance)
+    bump_tags(['feed:index', f'group:{instance.slug}'])
+
+
+@receiver(post_delete, sender=Upload)
+def upload_deleted(sender, instance, **kwargs):
+    uploads.remove_file(instance)
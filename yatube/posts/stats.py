@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+
+def increment(user_id, field, delta=1):
+    """Атомарно сдвинуть счётчик автора, не опускаясь ниже нуля.
+
+    Отсутствующую строку не создаёт: она появляется вместе с пользователем,
+    а расхождения исправляет команда ``recount``.
+    """
+    with transaction.atomic():
+        AuthorStats.objects.filter(author_id=user_id).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+
+
+def _count(model, field, outer='author'):
+    counts = model.objects.filter(
+        **{field: OuterRef(outer)}
+    ).order_by().values(field).annotate(total=Count('*')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+def recount(user_ids=None):
+    """Пересчитать счётчики одним UPDATE по всем (или указанным) авторам."""
+    users = User.objects.exclude(
+        pk__in=AuthorStats.objects.values('author')
+    )
+    stats = AuthorStats.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+        stats = stats.filter(author_id__in=user_ids)
+    with transaction.atomic():
+        AuthorStats.objects.bulk_create(
+            (
+                AuthorStats(author_id=pk)
+                for pk in users.values_list('pk', flat=True).iterator()
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        return stats.update(
+            posts_count=_count(Post, 'author'),
+            followers_count=_count(Follow, 'author'),
+            following_count=_count(Follow, 'user'),
+            comments_count=_count(Comment, 'author'),
+        )
+
+
+def get_stats(user):
+    """Статистика автора; без строки счётчики считаются одним запросом.
+
+    Такая статистика не сохраняется: чтение страницы ничего не пишет,
+    строки создают сигналы, миграция и команда ``recount``.
+    """
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        counts = User.objects.filter(pk=user.pk).values(
+            posts_count=_count(Post, 'author', 'pk'),
+            followers_count=_count(Follow, 'author', 'pk'),
+            following_count=_count(Follow, 'user', 'pk'),
+            comments_count=_count(Comment, 'author', 'pk'),
+        ).get()
+        return AuthorStats(author=user, **counts)
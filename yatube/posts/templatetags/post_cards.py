@@ -0,0 +1,76 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core import metrics
+from posts import thumbnails
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def card_key(post, show_author, show_group):
+    """Ключ карточки: id поста и хэш всего, что попадает в разметку."""
+    group = post.group
+    content = '\x00'.join(map(str, (
+        post.text,
+        post.pub_date.isoformat(),
+        post.image.name,
+        post.image_placeholder,
+        group and group.slug,
+        group and group.title,
+        post.author.username,
+        post.author.get_full_name(),
+    )))
+    version = hashlib.md5(content.encode()).hexdigest()
+    return f'post_card:{post.pk}:{show_author:d}{show_group:d}:{version}'
+
+
+@register.simple_tag
+def post_cards(posts, show_author=True, show_group=True):
+    """Карточки страницы парами ``(пост, html)``; HTML берётся из кэша.
+
+    Шаблон страницы сам обходит пары циклом ``{% for %}``.
+    Все карточки запрашиваются одним ``get_many``, шаблон рендерится
+    только для промахов; миниатюры для них ищутся тоже одним запросом
+    (``thumbnails.prefetch``). Карточки с заглушкой вместо миниатюры
+    не кэшируются.
+    """
+    keys = {card_key(post, show_author, show_group): post for post in posts}
+    cached = cache.get_many(keys)
+    thumbnails.prefetch(
+        post for key, post in keys.items() if key not in cached
+    )
+    rendered = {}
+    complete = {}
+    for key, post in keys.items():
+        if key not in cached:
+            with thumbnails.track() as missing:
+                rendered[key] = render_to_string(CARD_TEMPLATE, {
+                    'post': post,
+                    'show_author': show_author,
+                    'show_group': show_group,
+                })
+            if not missing:
+                complete[key] = rendered[key]
+    metrics.cache_event('card_hit', len(cached))
+    metrics.cache_event('card_miss', len(rendered))
+    if complete:
+        cache.set_many(complete, settings.POST_CARD_TIMEOUT)
+    cached.update(rendered)
+    return [(post, mark_safe(cached[key])) for key, post in keys.items()]
+
+
+@register.simple_tag
+def post_picture(post):
+    """Готовые варианты картинки поста (``thumbnails.Picture``) или ``None``.
+
+    Миниатюры здесь не создаются: недостающие только ставятся в очередь
+    (см. ``posts.thumbnails``), а шаблон показывает размытое превью.
+    """
+    return thumbnails.picture(post)
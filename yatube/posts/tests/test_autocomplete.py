@@ -0,0 +1,182 @@
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from posts.autocomplete import TOP_K, Autocomplete, PrefixIndex, autocomplete
+from posts.models import Follow, Group, Post, User
+
+
+def names(results):
+    return [name for _, name, _ in results]
+
+
+class PrefixIndexTest(TestCase):
+    def setUp(self):
+        self.index = PrefixIndex([
+            (1, 'anna', 5), (2, 'Andrey', 10), (3, 'anton', 1),
+            (4, 'boris', 100), (5, 'annushka', 7),
+        ])
+
+    def test_search_ranks_by_weight(self):
+        """Под префиксом сначала записи с большим весом, регистр неважен."""
+        self.assertEqual(
+            names(self.index.search('AN')),
+            ['Andrey', 'annushka', 'anna', 'anton'],
+        )
+        self.assertEqual(names(self.index.search('ann')), ['annushka', 'anna'])
+        self.assertEqual(names(self.index.search('annu')), ['annushka'])
+        self.assertEqual(self.index.search('x'), [])
+        self.assertEqual(self.index.search(''), [])
+        self.assertEqual(names(self.index.search('a', limit=1)), ['Andrey'])
+
+    def test_prefix_pks_are_in_name_order(self):
+        self.assertEqual(self.index.prefix_pks('an'), [2, 1, 5, 3])
+        self.assertEqual(self.index.prefix_pks('an', limit=2), [2, 1])
+
+    def test_upsert_rename_and_remove(self):
+        """Переименование и удаление обновляют массив и готовые топы."""
+        self.index.upsert(4, 'anatoly')
+        self.assertEqual(names(self.index.search('a'))[0], 'anatoly')
+        self.assertEqual(self.index.search('b'), [])
+        self.index.remove(2)
+        self.assertEqual(
+            names(self.index.search('an')),
+            ['anatoly', 'annushka', 'anna', 'anton'],
+        )
+        self.index.upsert(6, 'ann', 6)
+        self.assertEqual(
+            names(self.index.search('ann')), ['annushka', 'ann', 'anna']
+        )
+        self.assertEqual(len(self.index), 5)
+
+    def test_weight_changes_reorder_top(self):
+        """Запись, потерявшая вес, уступает место вне готового топа."""
+        index = PrefixIndex(
+            (pk, f'user{pk:02}', pk) for pk in range(1, TOP_K + 3)
+        )
+        self.assertNotIn('user01', names(index.search('use')))
+        index.set_weight(1, 1000)
+        self.assertEqual(names(index.search('use'))[0], 'user01')
+        index.set_weight(1, 0)
+        top = names(index.search('use'))
+        self.assertNotIn('user01', top)
+        self.assertEqual(len(top), TOP_K)
+        self.assertEqual(top[-1], 'user03')
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        autocomplete.indexes = None
+
+    def test_signals_update_index_after_commit(self):
+        """Подписки, посты и правки видны в подсказках после коммита."""
+        with self.captureOnCommitCallbacks(execute=True):
+            popular = User.objects.create_user(username='alice')
+            quiet = User.objects.create_user(username='alex')
+            reader = User.objects.create_user(username='reader')
+            group = Group.objects.create(
+                title='Группа', slug='alpha', description='Описание'
+            )
+        self.assertEqual(
+            [result['name'] for result in autocomplete.search('al')],
+            ['alex', 'alice', 'alpha'],
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(user=reader, author=popular)
+            Post.objects.create(author=quiet, group=group, text='Пост')
+            Post.objects.create(author=quiet, group=group, text='Пост')
+        self.assertEqual(autocomplete.search('al'), [
+            {'kind': 'group', 'name': 'alpha', 'weight': 2},
+            {'kind': 'user', 'name': 'alice', 'weight': 1},
+            {'kind': 'user', 'name': 'alex', 'weight': 0},
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            quiet.username = 'boris'
+            quiet.save()
+            group.delete()
+        self.assertEqual(
+            autocomplete.search('al', kinds=('user', 'group')),
+            [{'kind': 'user', 'name': 'alice', 'weight': 1}],
+        )
+
+    def test_other_process_replays_journal(self):
+        """Другой процесс дочитывает журнал изменений из общего кэша."""
+        other = Autocomplete()
+        other.load()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username='newcomer')
+        self.assertEqual(other.search('new'), [])
+        other.synced = 0
+        self.assertEqual(
+            [result['name'] for result in other.search('new')], ['newcomer']
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username='newbie')
+        change = cache.get('autocomplete:change:2')
+        cache.delete('autocomplete:change:2')
+        other.synced = 0
+        with mock.patch.object(other, 'load') as load:
+            self.assertEqual(
+                [result['name'] for result in other.search('new')],
+                ['newcomer'],
+            )
+            load.assert_not_called()
+            cache.set('autocomplete:change:2', change)
+            other.synced = 0
+            self.assertEqual(
+                [result['name'] for result in other.search('new')],
+                ['newbie', 'newcomer'],
+            )
+            load.assert_not_called()
+
+    def test_lost_change_reloads_after_one_retry(self):
+        """Запись журнала, которой нет и при второй попытке, — перезагрузка."""
+        other = Autocomplete()
+        other.load()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username='newbie')
+        cache.delete('autocomplete:change:1')
+        other.synced = 0
+        self.assertEqual(other.search('new'), [])
+        other.synced = 0
+        self.assertEqual(
+            [result['name'] for result in other.search('new')], ['newbie']
+        )
+
+    def test_reload_does_not_block_searches(self):
+        """Пока индексы перестраиваются, поиск отвечает по старым."""
+        other = Autocomplete()
+        other.indexes = {
+            'user': PrefixIndex([(1, 'newcomer', 0)]),
+            'group': PrefixIndex(),
+        }
+        started, release = threading.Event(), threading.Event()
+
+        def slow_load():
+            started.set()
+            release.wait(5)
+            return PrefixIndex()
+
+        with mock.patch.dict(
+            'posts.autocomplete.LOADERS', user=slow_load, group=PrefixIndex
+        ):
+            reload = threading.Thread(
+                target=other.publish, args=(('reload', None, None),)
+            )
+            reload.start()
+            self.assertTrue(started.wait(5))
+            results = []
+            search = threading.Thread(
+                target=lambda: results.append(other.search('new'))
+            )
+            search.start()
+            search.join(1)
+            release.set()
+            reload.join(5)
+        self.assertEqual(
+            [result['name'] for result in results[0]], ['newcomer']
+        )
+        self.assertEqual(other.search('new'), [])
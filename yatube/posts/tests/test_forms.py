@@ -1,9 +1,34 @@
-from django.test import Client, TestCase
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+from posts import ingest
 from posts.models import Group, Post, User, Comment
 from django.core.cache import cache
 from http import HTTPStatus
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def photo(size=(4000, 3000), orientation=6, image_format='JPEG'):
+    """Снимок как с телефона: EXIF с поворотом и моделью камеры."""
+    image = Image.new('RGB', size, 'blue')
+    image.paste('yellow', (0, 0, size[0] // 2, size[1] // 2))
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    exif[0x0110] = 'Phone 15'
+    output = BytesIO()
+    image.save(output, image_format, exif=exif.tobytes())
+    return output.getvalue()
+
 
 class PostsFormsTests(TestCase):
     @classmethod
@@ -112,3 +137,121 @@ class PostsFormsTests(TestCase):
             'posts:post_detail', kwargs={'post_id': self.post.id}))
         self.assertEqual(Comment.objects.count(), comment_count + 1)
         self.assertEqual(comment.text, form_data['text'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_INGEST_WORKERS=0)
+class ImageIngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_normalize_rotates_downscales_and_strips_exif(self):
+        """Поворот из EXIF применяется, EXIF убирается, JPEG прогрессивный."""
+        image = Image.open(BytesIO(ingest.normalize(photo(), 10**8, 2560)))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (1920, 2560))
+        self.assertEqual(len(image.getexif()), 0)
+        self.assertTrue(image.info.get('progressive'))
+        self.assertEqual(image.getpixel((1900, 10)), (255, 255, 0))
+
+    def test_other_formats_keep_their_format(self):
+        data = ingest.normalize(photo(image_format='PNG'), 10**8, 100)
+        image = Image.open(BytesIO(data))
+        self.assertEqual((image.format, image.size), ('PNG', (75, 100)))
+        self.assertEqual(len(image.getexif()), 0)
+
+    def test_animation_keeps_its_frames(self):
+        """Анимированный GIF уменьшается покадрово и остаётся анимацией."""
+        frames = [
+            Image.new('RGB', (400, 200), color)
+            for color in ('red', 'green', 'blue')
+        ]
+        output = BytesIO()
+        frames[0].save(
+            output, 'GIF', save_all=True, append_images=frames[1:],
+            duration=[100, 200, 300], loop=0,
+        )
+        data = ingest.normalize(output.getvalue(), 10**8, 100)
+        image = Image.open(BytesIO(data))
+        self.assertEqual((image.format, image.size), ('GIF', (100, 50)))
+        self.assertEqual(image.n_frames, 3)
+        self.assertEqual(image.info['loop'], 0)
+        durations = []
+        for index in range(image.n_frames):
+            image.seek(index)
+            durations.append(image.info['duration'])
+        self.assertEqual(durations, [100, 200, 300])
+        with self.assertRaisesMessage(ingest.IngestError, 'из 3 кадров'):
+            ingest.normalize(output.getvalue(), 200_000, 100)
+
+    def test_limits(self):
+        """Слишком большие и битые файлы отклоняются до декодирования."""
+        with self.assertRaisesMessage(ingest.IngestError, 'больше 1 Мп'):
+            ingest.normalize(photo(), 1_000_000, 2560)
+        with self.assertRaises(ingest.IngestError):
+            ingest.normalize(b'not an image at all', 10**8, 2560)
+        with self.assertRaises(ingest.IngestError):
+            ingest.normalize(photo()[:2000], 10**8, 2560)
+        with override_settings(IMAGE_MAX_BYTES=1000):
+            with self.assertRaisesMessage(ingest.IngestError, 'Файл больше'):
+                ingest.ingest(photo())
+
+    def test_form_stores_normalized_image(self):
+        """Пост сохраняет уже пережатую картинку с исходным расширением."""
+        with override_settings(IMAGE_MAX_EDGE=800):
+            self.client.post(reverse('posts:post_create'), {
+                'text': 'Снимок',
+                'image': SimpleUploadedFile('snap.jpg', photo()),
+            })
+        post = Post.objects.get(text='Снимок')
+        self.assertRegex(
+            post.image.name, r'^posts/\w\w/\w\w/[0-9a-f]{64}\.jpg$'
+        )
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (600, 800))
+
+    def test_form_rejects_bomb(self):
+        with override_settings(IMAGE_MAX_PIXELS=10_000):
+            response = self.client.post(reverse('posts:post_create'), {
+                'text': 'Бомба',
+                'image': SimpleUploadedFile('bomb.png', photo(
+                    image_format='PNG'
+                )),
+            })
+        self.assertFormError(response, 'form', 'image', [
+            'Картинка 4000×3000 больше 0.01 Мп.'
+        ])
+        self.assertFalse(Post.objects.filter(text='Бомба').exists())
+
+    @override_settings(IMAGE_INGEST_WORKERS=1, IMAGE_INGEST_TIMEOUT=0.01)
+    def test_slot_is_held_until_worker_finishes(self):
+        """Не дождавшийся запрос не освобождает место, пока воркер занят."""
+        future = Future()
+        pool = mock.Mock(submit=mock.Mock(return_value=future))
+        slots = threading.BoundedSemaphore(1)
+        with mock.patch.object(ingest, 'executor', return_value=(
+            pool, slots
+        )):
+            with self.assertRaisesMessage(ingest.IngestError, 'долго'):
+                ingest.ingest(b'image')
+            with self.assertRaisesMessage(ingest.IngestError, 'перегружен'):
+                ingest.ingest(b'image')
+        future.set_result(b'done')
+        self.assertTrue(slots.acquire(blocking=False))
+
+    def test_process_pool(self):
+        """Картинка обрабатывается в отдельном процессе пула."""
+        with override_settings(IMAGE_INGEST_WORKERS=1):
+            data = ingest.ingest(photo(size=(300, 200)))
+            pool, _ = ingest.executor()
+            ingest.reset(pool)
+        self.assertEqual(Image.open(BytesIO(data)).size, (200, 300))
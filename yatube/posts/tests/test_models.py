@@ -1,5 +1,19 @@
-from django.test import TestCase
-from posts.models import Group, Post, User
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from posts import media
+from posts.models import (
+    AuthorStats, Comment, Follow, Group, MediaFile, Post, User
+)
+from posts.stats import get_stats, recount
 from django.core.cache import cache
 
 
@@ -65,3 +79,166 @@ class PostsModelsTests(TestCase):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_help_text
                 )
+
+
+class AuthorStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(author=user)
+
+    def test_counters_follow_signals(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='Ответ')
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.stats(self.reader).comments_count, 1)
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).comments_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """recount исправляет расхождение счётчиков."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text='Пост') for _ in range(3)
+        )
+        AuthorStats.objects.filter(author=self.reader).delete()
+        recount()
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+
+    def test_get_stats_without_row_does_not_write(self):
+        """Без строки статистика считается на лету и не сохраняется."""
+        Post.objects.create(author=self.author, text='Пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.filter(author=self.author).delete()
+        author = User.objects.get(pk=self.author.pk)
+        with self.assertNumQueries(2):
+            stats = get_stats(author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertFalse(AuthorStats.objects.filter(author=author).exists())
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaFileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def post(self, content, name='photo.jpg'):
+        return Post.objects.create(
+            author=self.author, text='Пост',
+            image=ContentFile(content, name=name),
+        )
+
+    def test_file_lives_while_referenced(self):
+        """Одинаковые картинки хранятся один раз до удаления всех постов."""
+        first = self.post(b'same', 'a.jpg')
+        second = self.post(b'same', 'b.jpg')
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(media.storage().exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.image = ContentFile(b'other', name='c.jpg')
+            second.save()
+        self.assertFalse(media.storage().exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+        self.assertEqual(
+            MediaFile.objects.get(name=second.image.name).refs, 1
+        )
+
+    def test_upload_takes_reference_before_write(self):
+        """Удаление, ждущее коммита, не сносит файл, который загрузили снова.
+
+        Удаление вклинивается между проверкой хранилища «файл уже есть»
+        и сохранением поста — ссылка к этому моменту должна быть взята.
+        """
+        name = self.post(b'same').image.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            Post.objects.get(image=name).delete()
+        storage = media.storage()
+        exists = storage.exists
+
+        def exists_then_remove(path):
+            found = exists(path)
+            while storage.is_hashed(path) and callbacks:
+                callbacks.pop()()
+            return found
+
+        with mock.patch.object(storage, 'exists', exists_then_remove):
+            second = self.post(b'same')
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaFile.objects.get(name=name).refs, 1)
+
+    def test_names_outside_storage_are_not_removed(self):
+        """Старые абсолютные пути не удаляются и не ломают удаление поста."""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as outside:
+            post = Post.objects.create(
+                author=self.author, text='Старый', image=outside.name
+            )
+            with self.assertLogs('posts.media', 'WARNING'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    post.delete()
+            self.assertTrue(os.path.exists(outside.name))
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_recount_fixes_only_drifted_rows(self):
+        """Пересчёт правит расхождения, не очищая таблицу учёта."""
+        kept = self.post(b'kept').image.name
+        drifted = self.post(b'drifted').image.name
+        MediaFile.objects.filter(name=drifted).update(refs=5)
+        MediaFile.objects.create(name='posts/unused.jpg', refs=1)
+        self.assertEqual(media.recount(), 2)
+        self.assertEqual(
+            dict(MediaFile.objects.values_list('name', 'refs')),
+            {kept: 1, drifted: 1},
+        )
+
+    def test_migrate_media_renames_in_batches(self):
+        """Команда переносит файлы, склеивает дубликаты и считает ссылки."""
+        legacy = FileSystemStorage()
+        for i, content in enumerate((b'one', b'two', b'one')):
+            legacy.save(f'posts/old{i}.jpg', ContentFile(content))
+        Post.objects.bulk_create(
+            Post(author=self.author, text='Старый', image=f'posts/old{i}.jpg')
+            for i in (0, 1, 2, 2)
+        )
+        Post.objects.create(
+            author=self.author, text='Потерян', image='posts/lost.jpg'
+        )
+        call_command(
+            'migrate_media', batch_size=2, stdout=StringIO(), stderr=StringIO()
+        )
+        names = Post.objects.exclude(text='Потерян').values_list(
+            'image', flat=True
+        )
+        self.assertTrue(all(map(media.storage().is_hashed, names)))
+        self.assertEqual(len(set(names)), 2)
+        self.assertEqual(
+            sorted(MediaFile.objects.values_list('refs', flat=True)),
+            [1, 1, 3],
+        )
+        self.assertFalse(legacy.exists('posts/old0.jpg'))
+        self.assertTrue(Post.objects.filter(image='posts/lost.jpg').exists())
@@ -0,0 +1,137 @@
+from django.core.paginator import Page
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.core.cache import cache
+from posts.models import Post, User
+from posts.paginators import (
+    ApproximatePaginator, CachedCount, CursorPaginator, EstimatedCount,
+    ExactCount, decode_cursor, encode_cursor
+)
+
+PER_PAGE = 10
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(25)
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_cursor_roundtrip(self):
+        """Курсор декодируется в исходную пару (pub_date, id)."""
+        post = Post.objects.first()
+        cursor = encode_cursor(post.pub_date, post.pk)
+        self.assertEqual(decode_cursor(cursor), (post.pub_date, post.pk))
+
+    def test_pages_cover_all_posts_once(self):
+        """Проход по курсорам отдаёт каждый пост ровно один раз."""
+        paginator = CursorPaginator(Post.objects.all(), PER_PAGE)
+        page = paginator.get_cursor_page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.get_cursor_page(before=page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(
+            [post.pk for post in seen],
+            list(Post.objects.order_by('-pub_date', '-id')
+                 .values_list('pk', flat=True))
+        )
+
+    def test_newer_link_returns_previous_page(self):
+        """Ссылка «новее» возвращает на предыдущую страницу."""
+        paginator = CursorPaginator(Post.objects.all(), PER_PAGE)
+        first = paginator.get_cursor_page()
+        second = paginator.get_cursor_page(before=first.next_cursor)
+        third = paginator.get_cursor_page(before=second.next_cursor)
+        back = paginator.get_cursor_page(after=third.previous_cursor)
+        self.assertEqual(list(back), list(second))
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+
+    def test_insert_does_not_shift_pages(self):
+        """Новый пост не сдвигает уже выданную следующую страницу."""
+        paginator = CursorPaginator(Post.objects.all(), PER_PAGE)
+        first = paginator.get_cursor_page()
+        expected = list(paginator.get_cursor_page(before=first.next_cursor))
+        Post.objects.create(author=self.user, text='Свежий пост')
+        paginator = CursorPaginator(Post.objects.all(), PER_PAGE)
+        self.assertEqual(
+            list(paginator.get_cursor_page(before=first.next_cursor)),
+            expected
+        )
+
+    def test_cursor_is_opt_in(self):
+        """Без before/after лента отдаёт обычный Page с номерами."""
+        response = self.guest_client.get(reverse('posts:index'))
+        page = response.context['page_obj']
+        self.assertIs(type(page), Page)
+        self.assertEqual(page.paginator.num_pages, 3)
+        cursor = encode_cursor(page[-1].pub_date, page[-1].pk)
+        response = self.guest_client.get(
+            reverse('posts:index') + f'?before={cursor}'
+        )
+        self.assertTrue(response.context['page_obj'].paginator.is_cursor)
+        self.assertTrue(response.context['page_obj'].has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор в адресе отдаёт первую страницу."""
+        response = self.guest_client.get(
+            reverse('posts:index') + '?before=%%%'
+        )
+        self.assertEqual(len(response.context['page_obj']), PER_PAGE)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
+class ApproximatePaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(100)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_max_pages_caps_deep_pages(self):
+        """Страница глубже max_pages отдаётся как последняя разрешённая."""
+        paginator = ApproximatePaginator(Post.objects.all(), 2, max_pages=5)
+        self.assertEqual(paginator.num_pages, 5)
+        self.assertEqual(paginator.get_page(5000).number, 5)
+
+    def test_elided_page_range(self):
+        """Навигация показывает окно вокруг текущей страницы."""
+        paginator = ApproximatePaginator(Post.objects.all(), 2)
+        page_range = list(paginator.get_page(25).elided_page_range)
+        self.assertEqual(
+            page_range,
+            [1, paginator.ELLIPSIS, 23, 24, 25, 26, 27, paginator.ELLIPSIS, 50]
+        )
+
+    def test_cached_count_reuses_value(self):
+        """Кэшированный подсчёт не ходит в базу повторно."""
+        strategy = CachedCount(timeout=60)
+        self.assertEqual(strategy(Post.objects.all()), 100)
+        with self.assertNumQueries(0):
+            self.assertEqual(strategy(Post.objects.all()), 100)
+
+    def test_cached_count_keys_on_query_params(self):
+        """Одинаковый текст SQL с разными параметрами — разные ключи."""
+        strategy = CachedCount(timeout=60)
+        Post.objects.filter(pk=Post.objects.first().pk).update(text='a, b')
+        self.assertEqual(strategy(Post.objects.filter(text__in=['a', 'b'])), 0)
+        self.assertEqual(strategy(Post.objects.filter(text__in=['a, b'])), 1)
+
+    def test_estimated_count_falls_back_for_filtered_queryset(self):
+        """Для фильтрованной выборки оценка уступает точному подсчёту."""
+        strategy = EstimatedCount(fallback=ExactCount())
+        self.assertEqual(strategy(Post.objects.filter(author=self.user)), 100)
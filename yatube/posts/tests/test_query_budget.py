@@ -0,0 +1,200 @@
+import json
+import os
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from about import urls as about_urls
+from posts import urls as posts_urls
+from posts.models import Comment, Follow, Group, Post, User
+from users import urls as users_urls
+
+BUDGETS_FILE = Path(__file__).with_name('query_budgets.json')
+
+# Как открыть каждую страницу: клиент и аргументы адреса.
+SCENARIOS = {
+    'posts:index': ('guest', {}),
+    'posts:group_list': ('guest', {'slug': 'hot'}),
+    'posts:profile': ('user', {'username': 'author'}),
+    'posts:post_detail': ('user', {'post_id': 'post'}),
+    'posts:search': ('guest', {}),
+    'posts:post_create': ('user', {}),
+    'posts:post_edit': ('author', {'post_id': 'post'}),
+    'posts:add_comment': ('user', {'post_id': 'post'}),
+    'posts:follow_index': ('user', {}),
+    'posts:profile_follow': ('user', {'username': 'quiet'}),
+    'posts:profile_unfollow': ('user', {'username': 'author'}),
+    'posts:profile_export': ('author', {'username': 'author'}),
+    'users:signup': ('guest', {}),
+    'users:logout': ('user', {}),
+    'users:login': ('guest', {}),
+    'users:password_reset': ('guest', {}),
+    'about:author': ('guest', {}),
+    'about:tech': ('guest', {}),
+}
+
+QUERY_PARAMS = {
+    'posts:search': {'q': 'пост', 'group': 'hot'},
+}
+
+
+def url_names():
+    return [
+        f'{module.app_name}:{pattern.name}'
+        for module in (posts_urls, users_urls, about_urls)
+        for pattern in module.urlpatterns
+    ]
+
+
+class QueryRecorder:
+    """Запросы к базе и число строк, прочитанных каждым из них."""
+
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, execute, sql, params, many, context):
+        context['cursor'].query_budget_record = record = [sql, 0]
+        self.queries.append(record)
+        return execute(sql, params, many, context)
+
+    def fetch(self, name):
+        def fetch(cursor, *args):
+            with cursor.db.wrap_database_errors:
+                rows = getattr(cursor.cursor, name)(*args)
+            record = getattr(cursor, 'query_budget_record', None)
+            if record is not None:
+                if name == 'fetchone':
+                    record[1] += rows is not None
+                else:
+                    record[1] += len(rows)
+            return rows
+        return fetch
+
+    def __enter__(self):
+        self.patches = [
+            mock.patch.object(CursorWrapper, name, self.fetch(name),
+                              create=True)
+            for name in ('fetchone', 'fetchmany', 'fetchall')
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.wrapper = connection.execute_wrapper(self.execute)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wrapper.__exit__(*exc_info)
+        for patch in self.patches:
+            patch.stop()
+
+    @property
+    def rows(self):
+        return sum(rows for _, rows in self.queries)
+
+    def report(self):
+        return '\n'.join(
+            f'{rows:>6} строк  {sql}' for sql, rows in self.queries
+        )
+
+
+class QueryBudgetTest(TestCase):
+    """Число запросов и прочитанных строк на каждую страницу.
+
+    Бюджеты лежат в ``query_budgets.json``. После намеренного изменения
+    запросов файл пересоздаётся запуском тестов с
+    ``UPDATE_QUERY_BUDGETS=1``.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.quiet = User.objects.create_user(username='quiet')
+        others = [
+            User.objects.create_user(username=f'other{i}') for i in range(3)
+        ]
+        groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=slug, description='Описание'
+            )
+            for i, slug in enumerate(['hot', 'warm', 'cold'])
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for other in others:
+            Follow.objects.create(user=cls.reader, author=other)
+            Follow.objects.create(user=other, author=cls.author)
+        for i in range(25):
+            cls.post = Post.objects.create(
+                text=f'Пост {i}', author=cls.author,
+                group=groups[i % 2] if i % 5 else None,
+            )
+        for i, other in enumerate(others * 5):
+            Post.objects.create(
+                text=f'Чужой пост {i}', author=other, group=groups[i % 3]
+            )
+            Comment.objects.create(
+                post=cls.post, author=other, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        self.clients = {'guest': Client()}
+        for name, user in (('user', self.reader), ('author', self.author)):
+            self.clients[name] = Client()
+            self.clients[name].force_login(user)
+
+    def measure(self, name):
+        client_name, kwargs = SCENARIOS[name]
+        kwargs = {
+            key: self.post.pk if value == 'post' else value
+            for key, value in kwargs.items()
+        }
+        client = self.clients[client_name]
+        cache.clear()
+        with QueryRecorder() as recorder:
+            response = client.get(
+                reverse(name, kwargs=kwargs), QUERY_PARAMS.get(name)
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, name)
+        return recorder
+
+    def test_every_url_has_budget(self):
+        """У каждой страницы из urls.py есть сценарий и бюджет."""
+        budgets = json.loads(BUDGETS_FILE.read_text())
+        for name in url_names():
+            with self.subTest(name=name):
+                self.assertIn(name, SCENARIOS)
+                self.assertIn(name, budgets)
+
+    def test_query_budgets(self):
+        """Страницы не превышают бюджет запросов и прочитанных строк."""
+        budgets = json.loads(BUDGETS_FILE.read_text())
+        measured = {}
+        for name in url_names():
+            recorder = self.measure(name)
+            measured[name] = {
+                'queries': len(recorder.queries), 'rows': recorder.rows
+            }
+            if name not in budgets:
+                continue
+            with self.subTest(name=name):
+                budget = budgets[name]
+                message = (
+                    f'{name}: {len(recorder.queries)} запросов, '
+                    f'{recorder.rows} строк при бюджете {budget}\n'
+                    f'{recorder.report()}'
+                )
+                self.assertLessEqual(
+                    len(recorder.queries), budget['queries'], message
+                )
+                self.assertLessEqual(recorder.rows, budget['rows'], message)
+        if os.environ.get('UPDATE_QUERY_BUDGETS'):
+            BUDGETS_FILE.write_text(
+                json.dumps(measured, indent=4, ensure_ascii=False) + '\n'
+            )
@@ -0,0 +1,120 @@
+from io import StringIO
+
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+from posts.search import TRIGGERS, match_expression, search_posts
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Котики', slug='cats', description='Про котиков'
+        )
+        cls.cat_post = Post.objects.create(
+            text='Кошка спит. Кошка ест. Кошка <b>мурлычет</b>.',
+            author=cls.author, group=cls.group,
+        )
+        cls.dog_post = Post.objects.create(
+            text='Собака гуляет, а кошка смотрит в окно.', author=cls.other
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Кошка номер {i}', author=cls.other) for i in range(12)
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_operators_are_not_passed_to_fts(self):
+        """Ввод пользователя превращается в набор префиксных слов."""
+        self.assertEqual(
+            match_expression('кош" OR NEAR(*'), '"кош"* "or"* "near"*'
+        )
+        self.assertEqual(match_expression('  ,. '), '')
+
+    def test_ranked_results_with_filters(self):
+        """Более релевантный пост выше, фильтры сужают выдачу."""
+        posts = list(search_posts('кошка'))
+        self.assertEqual(len(posts), 14)
+        self.assertEqual(posts[0], self.cat_post)
+        self.assertEqual(
+            list(search_posts('кошка', group='cats')), [self.cat_post]
+        )
+        self.assertEqual(
+            list(search_posts('окно', author='other')), [self.dog_post]
+        )
+
+    def test_index_follows_updates_and_deletes(self):
+        """Триггеры держат индекс в актуальном состоянии."""
+        self.dog_post.text = 'Попугай молчит'
+        self.dog_post.save()
+        self.assertEqual(list(search_posts('попугай')), [self.dog_post])
+        self.assertNotIn(self.dog_post, search_posts('собака'))
+        self.dog_post.delete()
+        self.assertFalse(search_posts('попугай').exists())
+
+    def test_search_page_highlights_and_paginates(self):
+        """Страница поиска подсвечивает совпадения и листается курсором."""
+        response = self.client.get(reverse('posts:search'), {'q': 'кошк'})
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 10)
+        content = response.content.decode()
+        self.assertIn('<mark>Кошка</mark>', content)
+        self.assertIn('&lt;b&gt;', content)
+        self.assertIn('?q=%D0%BA%D0%BE%D1%88%D0%BA&amp;before=', content)
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кошк', 'before': page.next_cursor}
+        )
+        rest = response.context['page_obj']
+        self.assertEqual(len(rest), 4)
+        self.assertFalse(set(page) & set(rest))
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через индекс FTS5."""
+        admin = site._registry[Post]
+        request = RequestFactory().get('/admin/posts/post/')
+        queryset, may_have_duplicates = admin.get_search_results(
+            request, Post.objects.all(), 'окно'
+        )
+        self.assertEqual(list(queryset), [self.dog_post])
+        self.assertIn('posts_post_fts', str(queryset.query))
+
+    def test_admin_search_without_words(self):
+        """Строка из одних знаков в админке ничего не находит, а не 500."""
+        self.client.force_login(
+            User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        )
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': '!!!'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_migrate_restores_lost_triggers(self):
+        """После migrate поиск видит новые посты, даже если триггеры
+        пропали при пересоздании таблицы."""
+        with connection.cursor() as cursor:
+            for name in TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {name}')
+        lost = Post.objects.create(text='Потерянный енот', author=self.author)
+        call_command('migrate', verbosity=0)
+        fresh = Post.objects.create(text='Свежий енот', author=self.author)
+        self.assertEqual(set(search_posts('енот')), {lost, fresh})
+
+    def test_rebuild_command(self):
+        """Команда пересобирает индекс по текущим постам."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO posts_post_fts (posts_post_fts) "
+                "VALUES ('delete-all')"
+            )
+        self.assertFalse(search_posts('кошка').exists())
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search_posts('кошка').count(), 14)
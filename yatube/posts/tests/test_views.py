@@ -1,12 +1,29 @@
+import gzip
+import json
 import shutil
 import tempfile
-from django.test import Client, TestCase, override_settings
+from io import BytesIO, StringIO
+from unittest import mock
+from django.core.management import CommandError, call_command
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
 from django.urls import reverse
 from django import forms
-from posts.models import Group, Post, User, Follow
+from PIL import Image
+from posts import thumbnails
+from posts.models import (
+    Comment, Follow, Group, ImportedPost, ImportRun, MediaFile, Post,
+    TimelineEntry, User
+)
+from posts.templatetags.post_cards import card_key, post_cards
 from django.core.cache import cache
 from http import HTTPStatus
 from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 
@@ -16,7 +33,11 @@ ZERO = 0
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+def cards_html(posts):
+    return ''.join(card for _, card in post_cards(posts))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostsViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -330,3 +351,497 @@ class FollowViewTest(TestCase):
         self.auth_client.force_login(self.second_user)
         response = self.auth_client.get(reverse('posts:follow_index'))
         self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_post_after_follow_appears_in_timeline(self):
+        """Пост, опубликованный после подписки, попадает в ленту."""
+        Follow.objects.create(author=self.author, user=self.user)
+        post = Post.objects.create(text='Новый текст', author=self.author)
+        response = self.auth_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+    @override_settings(TIMELINE_LENGTH=3, TIMELINE_TRIM_EVERY=1)
+    def test_fan_out_trims_timeline(self):
+        """Новые посты не растят ленту подписчика сверх TIMELINE_LENGTH."""
+        Follow.objects.create(author=self.author, user=self.user)
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(6)
+        ]
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.user).values_list(
+                'post', flat=True
+            )),
+            [post.pk for post in posts[:-4:-1]],
+        )
+
+    @override_settings(TIMELINE_TRIM_EVERY=2)
+    def test_fan_out_trims_only_sampled_followers(self):
+        """Пост проверяет длину лент лишь части подписчиков."""
+        readers = [
+            User.objects.create_user(username=f'reader{i}') for i in range(2)
+        ]
+        for reader in readers:
+            Follow.objects.create(author=self.author, user=reader)
+        with mock.patch('posts.timeline.trim') as trim:
+            post = Post.objects.create(text='Пост', author=self.author)
+        sampled = [r.pk for r in readers if r.pk % 2 == post.pk % 2]
+        trim.assert_has_calls([mock.call(pk) for pk in sampled])
+        self.assertEqual(trim.call_count, 1)
+
+    def test_unfollow_clears_timeline(self):
+        """После отписки посты автора пропадают из ленты."""
+        Post.objects.create(text='Тестовый текст', author=self.author)
+        Follow.objects.create(author=self.author, user=self.user)
+        self.auth_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author.username})
+        )
+        response = self.auth_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленту."""
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        Follow.objects.create(author=self.author, user=self.user)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user', 'post')),
+            [(self.user.pk, post.pk)]
+        )
+
+
+class TaggedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_index_is_served_from_cache(self):
+        """Без инвалидации главная страница отдаётся из кэша."""
+        content = self.guest_client.get(reverse('posts:index')).content
+        Post.objects.bulk_create(
+            [Post(text='Мимо сигналов', author=self.user)]
+        )
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response.content, content)
+
+    def test_new_post_invalidates_pages(self):
+        """Новый пост сразу виден на главной и на странице группы."""
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        ]
+        for page in pages:
+            self.guest_client.get(page)
+        Post.objects.create(
+            text='Свежий пост', author=self.user, group=self.group
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.guest_client.get(page)
+                self.assertContains(response, 'Свежий пост')
+
+    def test_moved_post_leaves_old_group_page(self):
+        """Перенос поста в другую группу обновляет старую группу."""
+        post = Post.objects.create(
+            text='Переезжающий пост', author=self.user, group=self.group
+        )
+        page = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.assertContains(self.guest_client.get(page), post.text)
+        post.group = None
+        post.save()
+        self.assertNotContains(self.guest_client.get(page), post.text)
+
+
+class PostCardsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.post = Post.objects.create(text='Текст карточки', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_are_rendered_once(self):
+        """Повторная отрисовка карточек берёт HTML из кэша."""
+        posts = list(Post.objects.select_related('author', 'group'))
+        html = cards_html(posts)
+        self.assertIn('Текст карточки', html)
+        with mock.patch('posts.templatetags.post_cards.render_to_string') as r:
+            self.assertEqual(cards_html(posts), html)
+            r.assert_not_called()
+
+    def test_edited_post_gets_new_card(self):
+        """Изменённый пост получает новую карточку."""
+        post = Post.objects.select_related('author', 'group').get()
+        cards_html([post])
+        post.text = 'Новый текст'
+        self.assertIn('Новый текст', cards_html([post]))
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_matching_etag_returns_not_modified(self):
+        """Повторный запрос с тем же ETag получает 304."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_comment_changes_post_detail_etag(self):
+        """Новый комментарий меняет ETag страницы поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.post = Post.objects.create(
+            text='Пост для выгрузки', author=cls.author
+        )
+        Comment.objects.create(post=cls.post, author=cls.author, text='Ответ')
+
+    def setUp(self):
+        self.auth_client = Client()
+        self.auth_client.force_login(self.author)
+        self.url = reverse(
+            'posts:profile_export', kwargs={'username': self.author.username}
+        )
+
+    def test_ndjson_export(self):
+        """Выгрузка NDJSON содержит посты и комментарии автора."""
+        response = self.auth_client.get(self.url)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['kind'] for row in rows], ['post', 'comment'])
+        self.assertEqual(rows[0]['text'], self.post.text)
+
+    def test_gzipped_csv_export(self):
+        """CSV можно получить сжатым на лету."""
+        response = self.auth_client.get(self.url, {'format': 'csv', 'gzip': 1})
+        content = gzip.decompress(b''.join(response.streaming_content))
+        self.assertTrue(content.decode().startswith('kind,id,post'))
+        self.assertEqual(len(content.decode().splitlines()), 3)
+
+    def test_other_user_cannot_export(self):
+        """Чужую выгрузку получить нельзя."""
+        client = Client()
+        client.force_login(self.other)
+        response = client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    def test_export_command(self):
+        """Команда export_posts пишет выгрузку в файл."""
+        with tempfile.NamedTemporaryFile(suffix='.ndjson') as output:
+            call_command('export_posts', 'author', output=output.name)
+            self.assertEqual(len(output.read().splitlines()), 2)
+
+
+class ImportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.rows = [
+            {'kind': 'post', 'id': 10, 'pub_date': '2020-01-02T10:00:00+00:00',
+             'group': 'imported', 'text': 'Старый пост'},
+            {'kind': 'comment', 'id': 1, 'post': 10, 'author': 'guest',
+             'pub_date': '2020-01-03T10:00:00+00:00', 'text': 'Ответ'},
+            {'kind': 'post', 'id': 11, 'pub_date': '2020-01-04T10:00:00+00:00',
+             'text': 'Ещё пост'},
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.path = f'{self.directory}/posts.ndjson'
+        self.write(self.rows)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_import_keeps_dates_and_rebuilds_derived_data(self):
+        """Импорт сохраняет даты, связи и обновляет счётчики и ленты."""
+        call_command(
+            'import_posts', self.path, author='author', create_missing=True,
+            batch_size=2, stdout=StringIO(),
+        )
+        post = Post.objects.get(text='Старый пост')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.group.slug, 'imported')
+        self.assertEqual(post.comments.get().author.username, 'guest')
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+
+    def test_resume_skips_imported_rows(self):
+        """С --resume уже записанные строки не импортируются повторно."""
+        post = Post.objects.create(text='Старый пост', author=self.author)
+        run = ImportRun.objects.create(name=self.path, done=2)
+        ImportedPost.objects.create(run=run, source_id='10', post=post)
+        call_command(
+            'import_posts', self.path, author='author', resume=True,
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)),
+            ['Старый пост', 'Ещё пост'],
+        )
+        self.assertFalse(ImportRun.objects.exists())
+
+    def test_failed_batch_is_not_counted_as_done(self):
+        """Упавшая пачка откатывается вместе с прогрессом и не дублируется."""
+        original = Comment.objects.bulk_create
+
+        def crash_on_comments(objects, **kwargs):
+            if objects:
+                raise RuntimeError('сбой')
+            return original(objects, **kwargs)
+
+        with mock.patch.object(
+            Comment.objects, 'bulk_create', side_effect=crash_on_comments
+        ):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    'import_posts', self.path, author='author',
+                    create_missing=True, batch_size=2, stdout=StringIO(),
+                )
+        self.assertEqual(ImportRun.objects.get().done, 0)
+        self.assertFalse(Post.objects.exists())
+        call_command(
+            'import_posts', self.path, author='author', resume=True,
+            batch_size=2, stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def write(self, rows):
+        with open(self.path, 'w', encoding='utf-8') as output:
+            for row in rows:
+                output.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def test_bad_row_is_reported_with_its_number(self):
+        """Ошибка разбора — CommandError с номером строки."""
+        self.write([
+            self.rows[0], {**self.rows[2], 'pub_date': 'вчера'},
+        ])
+        with self.assertRaisesMessage(CommandError, 'Строка 2: некорректная'):
+            call_command(
+                'import_posts', self.path, author='author',
+                create_missing=True, stdout=StringIO(),
+            )
+        self.assertEqual(Post.objects.count(), 0)
+
+    def test_imported_images_are_referenced(self):
+        """Картинки импортированных постов учтены и получают миниатюры."""
+        self.write([
+            {**self.rows[0], 'image': 'posts/aa/bb/same.jpg'},
+            {**self.rows[2], 'image': 'posts/aa/bb/same.jpg'},
+        ])
+        with mock.patch('posts.thumbnails.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command(
+                    'import_posts', self.path, author='author',
+                    create_missing=True, stdout=StringIO(),
+                )
+        self.assertEqual(
+            MediaFile.objects.get(name='posts/aa/bb/same.jpg').refs, 2
+        )
+        self.assertEqual(submit.call_count, 2)
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_import_trims_follower_timelines(self):
+        """Импорт раскладывает посты по лентам и обрезает их."""
+        Post.objects.create(text='Свежий', author=self.author)
+        call_command(
+            'import_posts', self.path, author='author', create_missing=True,
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.reader).values_list(
+                'post__text', flat=True
+            )),
+            ['Свежий', 'Ещё пост'],
+        )
+
+
+class SeedTest(TestCase):
+    def test_seed_creates_skewed_dataset(self):
+        """Команда seed создаёт связанные данные в прошлом."""
+        call_command(
+            'seed', users=30, groups=3, posts=60, comments=40, follows=50,
+            workers=2, batch_size=25, force=True, stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        self.assertFalse(
+            Comment.objects.filter(created__lt=F('post__pub_date')).exists()
+        )
+        self.assertEqual(
+            sum(User.objects.values_list('stats__posts_count', flat=True)),
+            60,
+        )
+
+
+def jpeg(name='photo.jpg', size=(64, 48)):
+    output = BytesIO()
+    Image.new('RGB', size, 'red').save(output, 'JPEG')
+    return SimpleUploadedFile(name, output.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_upload_generates_thumbnail_after_commit(self):
+        """Миниатюры и превью создаются после сохранения, а не при показе."""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(
+                reverse('posts:post_create'),
+                {'text': 'С картинкой', 'image': jpeg()},
+            )
+        self.assertEqual(len(callbacks), 1)
+        post = Post.objects.get(text='С картинкой')
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+        picture = thumbnails.picture(post)
+        self.assertEqual((picture.src.width, picture.src.height), (960, 339))
+        self.assertEqual(
+            [entry.split()[1] for entry in picture.webp_srcset.split(', ')],
+            ['320w', '480w', '640w', '960w'],
+        )
+        self.assertTrue(picture.srcset('webp').split()[0].endswith('.webp'))
+        with mock.patch('posts.thumbnails.submit') as submit:
+            response = self.client.get(reverse('posts:index'))
+        submit.assert_not_called()
+        self.assertContains(response, picture.src.url)
+        self.assertContains(response, picture.webp_srcset)
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """Пока миниатюр нет, видна заглушка, и карточка не кэшируется."""
+        post = Post.objects.create(
+            text='Ждёт миниатюру', author=self.user, image=jpeg('wait.jpg')
+        )
+        posts = list(Post.objects.select_related('author', 'group'))
+        with mock.patch('posts.thumbnails.submit') as submit:
+            html = cards_html(posts)
+        submit.assert_called_with(post.image.name, post.pk)
+        self.assertIn('Изображение обрабатывается', html)
+        self.assertNotIn('<img', html)
+        posts[0].image_placeholder = 'data:image/jpeg;base64,AAAA'
+        with mock.patch('posts.thumbnails.submit'):
+            self.assertIn(
+                'src="data:image/jpeg;base64,AAAA"', cards_html(posts)
+            )
+        html = cards_html(posts)
+        self.assertIn('<picture>', html)
+        with mock.patch('posts.thumbnails.submit') as submit:
+            self.assertEqual(cards_html(posts), html)
+        submit.assert_not_called()
+
+    def test_page_thumbnails_are_fetched_at_once(self):
+        """Миниатюры всей страницы читаются одним запросом к базе."""
+        for i in range(5):
+            post = Post.objects.create(
+                text=f'Пост {i}', author=self.user, image=jpeg(f'page{i}.jpg')
+            )
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        posts = list(Post.objects.select_related('author', 'group'))
+        with CaptureQueriesContext(connection) as queries:
+            html = cards_html(posts)
+        self.assertEqual(html.count('<picture>'), 5)
+        self.assertEqual(len([
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]), 1)
+        cache.delete_many([card_key(post, True, True) for post in posts])
+        posts = list(Post.objects.select_related('author', 'group'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(cards_html(posts), html)
+        self.assertEqual(len(queries), 0)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailBackfillTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_backfill_command(self):
+        """Команда создаёт миниатюры для уже загруженных картинок."""
+        user = User.objects.create_user(username='archive')
+        Post.objects.bulk_create([
+            Post(text=f'Старый {i}', author=user, image=f'posts/old{i}.jpg')
+            for i in range(3)
+        ])
+        for i in range(3):
+            default_storage.save(f'posts/old{i}.jpg', jpeg())
+        out = StringIO()
+        # Общая база в памяти не ждёт блокировок, поэтому пишет один поток.
+        call_command('generate_thumbnails', workers=1, stdout=out)
+        self.assertIn('3 картинок', out.getvalue())
+        with mock.patch('posts.thumbnails.submit') as submit:
+            for post in Post.objects.all():
+                self.assertIsNotNone(thumbnails.picture(post).src)
+                self.assertTrue(post.image_placeholder)
+        submit.assert_not_called()
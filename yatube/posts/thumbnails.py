@@ -0,0 +1,298 @@
+import base64
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.db import connections, transaction
+from PIL import Image, ImageFilter, ImageOps
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore
+
+from core.cache import bump_tags
+from . import media
+from .models import Post
+from .signals import post_tags
+
+logger = logging.getLogger(__name__)
+
+CARD_SIZE = (960, 339)
+CARD_WIDTHS = (320, 480, 640, 960)
+CARD_FORMATS = {'webp': ('WEBP', 80), 'jpeg': ('JPEG', 82)}
+CARD_SIZES = '(max-width: 992px) 100vw, 960px'
+PLACEHOLDER_SIZE = (24, 8)
+
+
+def card_variant(width, extension):
+    return f'card_{width}_{extension}'
+
+
+# Все миниатюры, которые показывают шаблоны: имя → геометрия и опции.
+GEOMETRIES = {
+    card_variant(width, extension): (
+        f'{width}x{round(width * CARD_SIZE[1] / CARD_SIZE[0])}',
+        {
+            'crop': 'center', 'upscale': True,
+            'format': image_format, 'quality': quality,
+        },
+    )
+    for extension, (image_format, quality) in CARD_FORMATS.items()
+    for width in CARD_WIDTHS
+}
+
+_local = threading.local()
+_pending = set()
+_pending_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class Backend(ThumbnailBackend):
+    """``ThumbnailBackend`` sorl, который умеет только смотреть в кэш."""
+
+    def get_many(self, sources):
+        """Готовые миниатюры для пар ``(картинка, имя варианта)``.
+
+        Ключи всех миниатюр читаются из кэша одним ``get_many``, промахи —
+        из таблицы key-value store одним запросом. Результат —
+        ``{(картинка, имя): ImageFile или None}``.
+        """
+        keys = {}
+        for image, name in sources:
+            geometry, options = GEOMETRIES[name]
+            thumbnail = self.thumbnail_file(
+                ImageFile(image), geometry, options
+            )
+            keys[add_prefix(thumbnail.key)] = (image, name)
+        values = self.get_many_raw(list(keys)) if keys else {}
+        return {
+            source: deserialize_image_file(values[key])
+            if values.get(key) else None
+            for key, source in keys.items()
+        }
+
+    def get_many_raw(self, keys):
+        kvstore = default.kvstore
+        if not isinstance(kvstore, cached_db_kvstore.KVStore):
+            return {key: kvstore._get_raw(key) for key in keys}
+        empty = cached_db_kvstore.EMPTY_VALUE
+        values = kvstore.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            stored = dict(KVStore.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            kvstore.cache.set_many(
+                {key: stored.get(key, empty) for key in missing},
+                thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT,
+            )
+            values.update(stored)
+        return {
+            key: value for key, value in values.items() if value != empty
+        }
+
+    def thumbnail_file(self, source, geometry, options):
+        """Файл миниатюры с теми же опциями, что у ``get_thumbnail``."""
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry, options)
+        return ImageFile(name, default.storage)
+
+
+backend = Backend()
+
+
+def source(image_name):
+    """Картинка поста по имени — в том же хранилище, что у поля модели."""
+    return ImageFile(image_name, media.storage())
+
+
+def prefetch(posts):
+    """Найти миниатюры всех постов страницы одним обращением к кэшу.
+
+    Результат запоминается в ``post.thumbnails`` и живёт, пока живут
+    объекты постов, то есть до конца запроса; уже найденные посты
+    пропускаются.
+    """
+    posts = [
+        post for post in posts
+        if post.image and not hasattr(post, 'thumbnails')
+    ]
+    found = backend.get_many(
+        (post.image, name) for post in posts for name in GEOMETRIES
+    )
+    for post in posts:
+        post.thumbnails = {
+            name: found[post.image, name] for name in GEOMETRIES
+        }
+
+
+class Picture:
+    """Варианты карточной миниатюры для ``<picture>`` с ``srcset``.
+
+    ``src`` — самый широкий готовый JPEG; пока его нет, шаблон показывает
+    размытое превью ``placeholder``.
+    """
+
+    width, height = CARD_SIZE
+    sizes = CARD_SIZES
+
+    def __init__(self, variants, placeholder=''):
+        self.variants = variants
+        self.placeholder = placeholder
+
+    def ready(self, extension):
+        return [
+            (width, self.variants[card_variant(width, extension)])
+            for width in CARD_WIDTHS
+            if self.variants.get(card_variant(width, extension))
+        ]
+
+    @property
+    def src(self):
+        ready = self.ready('jpeg')
+        return ready[-1][1] if ready else None
+
+    def srcset(self, extension):
+        return ', '.join(
+            f'{thumbnail.url} {width}w'
+            for width, thumbnail in self.ready(extension)
+        )
+
+    @property
+    def webp_srcset(self):
+        return self.srcset('webp')
+
+    @property
+    def jpeg_srcset(self):
+        return self.srcset('jpeg')
+
+
+def picture(post):
+    """``Picture`` картинки поста.
+
+    Если каких-то вариантов нет, генерация ставится в очередь, а пост
+    отмечается в ``track()``.
+    """
+    if not post.image:
+        return None
+    prefetch([post])
+    if not all(post.thumbnails.values()):
+        submit(post.image.name, post.pk)
+        if not settings.THUMBNAIL_WORKERS:
+            del post.thumbnails
+            prefetch([post])
+    if not all(post.thumbnails.values()):
+        missing = getattr(_local, 'missing', None)
+        if missing is not None:
+            missing.append(post.image.name)
+    return Picture(post.thumbnails, post.image_placeholder)
+
+
+def blur_placeholder(image_name):
+    """Крошечная размытая копия картинки как ``data:`` URI (около 0,5 КБ)."""
+    with media.storage().open(image_name) as original:
+        image = Image.open(original)
+        image.draft('RGB', (PLACEHOLDER_SIZE[0] * 4, PLACEHOLDER_SIZE[1] * 4))
+        image = ImageOps.fit(image.convert('RGB'), PLACEHOLDER_SIZE)
+    image = image.filter(ImageFilter.GaussianBlur(1))
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=50)
+    data = base64.b64encode(output.getvalue()).decode()
+    return f'data:image/jpeg;base64,{data}'
+
+
+class track:
+    """Собрать имена картинок без готовых миниатюр за время рендеринга.
+
+    Карточку с заглушкой нельзя класть в кэш: она не обновится, когда
+    миниатюра будет готова.
+    """
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'missing', None)
+        _local.missing = self.missing = []
+        return self.missing
+
+    def __exit__(self, *exc_info):
+        _local.missing = self.previous
+        if self.previous is not None:
+            self.previous.extend(self.missing)
+
+
+def generate(image_name, post_id=None):
+    """Сгенерировать превью и все миниатюры, сбросить кэш страниц поста."""
+    try:
+        Post.objects.filter(image=image_name).update(
+            image_placeholder=blur_placeholder(image_name)
+        )
+        for geometry, options in GEOMETRIES.values():
+            default.backend.get_thumbnail(
+                source(image_name), geometry, **options
+            )
+        post = Post.objects.filter(pk=post_id).first() if post_id else None
+        if post is not None:
+            bump_tags(post_tags(post))
+    finally:
+        with _pending_lock:
+            _pending.discard(image_name)
+
+
+def run(image_name, post_id=None):
+    try:
+        generate(image_name, post_id)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', image_name)
+
+
+def run_in_worker(image_name, post_id):
+    try:
+        run(image_name, post_id)
+    finally:
+        connections.close_all()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails'
+            )
+        return _executor
+
+
+def submit(image_name, post_id=None):
+    """Поставить генерацию в очередь пула, если её ещё там нет.
+
+    С ``THUMBNAIL_WORKERS = 0`` миниатюры создаются сразу, в этом потоке.
+    """
+    with _pending_lock:
+        if image_name in _pending:
+            return
+        _pending.add(image_name)
+    if not settings.THUMBNAIL_WORKERS:
+        run(image_name, post_id)
+        return
+    executor().submit(run_in_worker, image_name, post_id)
+
+
+def enqueue(post):
+    """Создать миниатюры поста после фиксации транзакции."""
+    if post.image:
+        name, pk = post.image.name, post.pk
+        transaction.on_commit(lambda: submit(name, pk))
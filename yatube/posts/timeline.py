@@ -0,0 +1,132 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+from .models import Follow, Post, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+def _entries(user_id, rows):
+    return [
+        TimelineEntry(
+            user_id=user_id, post_id=post_id, author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, author_id, pub_date in rows
+    ]
+
+
+def fan_out(post):
+    """Разложить новый пост по лентам всех подписчиков автора.
+
+    Обрезка не считает длину всех лент: каждый пост проверяет только
+    подписчиков с ``user_id ≡ post.pk (mod TIMELINE_TRIM_EVERY)``, по
+    одному запросу по индексу на каждого. Лента между проверками
+    вырастает в среднем на ``TIMELINE_TRIM_EVERY`` записей.
+    """
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id, post_id=post.pk,
+                author_id=post.author_id, pub_date=post.pub_date,
+            )
+            for user_id in follower_ids.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    every = settings.TIMELINE_TRIM_EVERY
+    sampled = follower_ids.annotate(
+        bucket=F('user_id') % every
+    ).filter(bucket=post.pk % every)
+    for user_id in list(sampled):
+        trim(user_id)
+
+
+def fan_out_many(posts):
+    """Разложить по лентам подписчиков сразу много постов (импорт).
+
+    Пары «читатель — пост» идут одним запросом и вставляются пачками;
+    ленты потом обрезает ``trim_many`` тоже одним запросом.
+    """
+    rows = posts.filter(author__following__isnull=False).values_list(
+        'author__following__user_id', 'id', 'author_id', 'pub_date'
+    ).iterator()
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=user_id, post_id=post_id, author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for user_id, post_id, author_id, pub_date in batch
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def trim_many(user_ids):
+    """``trim`` для всех читателей из подзапроса ``user_ids`` разом."""
+    ranked = TimelineEntry.objects.filter(user_id__in=user_ids).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=F('user_id'),
+            order_by=(F('pub_date').desc(), F('post_id').desc()),
+        )
+    ).values('pk', 'position')
+    sql, params = ranked.query.sql_with_params()
+    TimelineEntry.objects.filter(pk__in=RawSQL(
+        f'SELECT id FROM ({sql}) ranked WHERE position > %s',
+        (*params, settings.TIMELINE_LENGTH),
+    )).delete()
+
+
+def backfill(user_id, author_id):
+    """Добавить в ленту последние посты автора после подписки."""
+    rows = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'author_id', 'pub_date')[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        _entries(user_id, rows),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def remove(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def trim(user_id):
+    """Оставить в ленте не больше ``TIMELINE_LENGTH`` последних записей."""
+    cutoff = TimelineEntry.objects.filter(user_id=user_id).values_list(
+        'pub_date', 'post_id'
+    )[settings.TIMELINE_LENGTH:settings.TIMELINE_LENGTH + 1]
+    for pub_date, post_id in cutoff:
+        TimelineEntry.objects.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, post_id__lte=post_id),
+            user_id=user_id,
+        ).delete()
+
+
+def rebuild(user_id):
+    """Пересобрать ленту пользователя с нуля по его подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    rows = Post.objects.filter(author__following__user_id=user_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'author_id', 'pub_date')[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        _entries(user_id, rows), batch_size=BATCH_SIZE
+    )
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .ingest import IngestError, check_size
+from .models import Upload
+
+BLOCK_SIZE = 64 * 1024
+SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    """Ошибка загрузки: HTTP-статус ответа и текст для клиента."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def expire():
+    """Удалить загрузки старше ``CHUNKED_UPLOAD_EXPIRY`` вместе с файлами."""
+    Upload.objects.filter(created__lt=timezone.now() - timedelta(
+        seconds=settings.CHUNKED_UPLOAD_EXPIRY
+    )).delete()
+
+
+def start(user, filename, size, sha256):
+    """Начать загрузку файла известного размера и контрольной суммы."""
+    filename = os.path.basename(str(filename or '')).strip()
+    sha256 = str(sha256 or '').lower()
+    if not filename:
+        raise UploadError(400, 'Не указано имя файла.')
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError(400, 'size должен быть положительным числом.')
+    if not SHA256.match(sha256):
+        raise UploadError(400, 'sha256 должен быть hex-строкой.')
+    try:
+        check_size(size)
+    except IngestError as error:
+        raise UploadError(413, str(error))
+    expire()
+    upload = Upload.objects.create(
+        user=user, filename=filename[-255:], size=size, sha256=sha256
+    )
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(upload.path, 'wb').close()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length):
+    """Дописать часть с позиции ``offset``, читая ``stream`` блоками.
+
+    В памяти держится один блок, а не вся часть. Часть принимается,
+    только если ``offset`` совпадает с уже полученным: повтор потерянной
+    части безопасен, а пропуск — нет. Последняя часть запускает проверку
+    SHA-256.
+    """
+    if upload.complete:
+        raise UploadError(409, 'Загрузка уже завершена.')
+    if offset != upload.received:
+        raise UploadError(409, f'Ожидается часть с позиции {upload.received}.')
+    if not 0 < length <= settings.CHUNKED_UPLOAD_CHUNK_SIZE:
+        raise UploadError(
+            413,
+            f'Часть должна быть от 1 до '
+            f'{settings.CHUNKED_UPLOAD_CHUNK_SIZE} байт.',
+        )
+    if offset + length > upload.size:
+        raise UploadError(413, 'Часть выходит за объявленный размер файла.')
+    written = 0
+    with open(upload.path, 'r+b') as output:
+        output.seek(offset)
+        while written < length:
+            block = stream.read(min(BLOCK_SIZE, length - written))
+            if not block:
+                break
+            output.write(block)
+            written += len(block)
+        output.truncate()
+    if written != length:
+        raise UploadError(400, 'Часть получена не полностью.')
+    moved = Upload.objects.filter(pk=upload.pk, received=offset).update(
+        received=offset + length
+    )
+    if not moved:
+        upload.refresh_from_db()
+        raise UploadError(409, f'Ожидается часть с позиции {upload.received}.')
+    upload.received = offset + length
+    if upload.received == upload.size:
+        verify(upload)
+    return upload
+
+
+def verify(upload):
+    digest = hashlib.sha256()
+    with open(upload.path, 'rb') as source:
+        for block in iter(lambda: source.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    if digest.hexdigest() != upload.sha256:
+        Upload.objects.filter(pk=upload.pk).update(received=0)
+        upload.received = 0
+        open(upload.path, 'wb').close()
+        raise UploadError(
+            422, 'Контрольная сумма не совпала, загрузите файл заново.'
+        )
+    Upload.objects.filter(pk=upload.pk).update(complete=True)
+    upload.complete = True
+
+
+def state(upload):
+    return {
+        'token': upload.token,
+        'offset': upload.received,
+        'size': upload.size,
+        'complete': upload.complete,
+        'chunk_size': settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+    }
+
+
+def completed(user, token):
+    """Завершённая загрузка пользователя или ``None``."""
+    return Upload.objects.filter(
+        pk=token, user=user, complete=True
+    ).first()
+
+
+def read(upload):
+    with open(upload.path, 'rb') as source:
+        return source.read()
+
+
+def remove_file(upload):
+    try:
+        os.remove(upload.path)
+    except FileNotFoundError:
+        pass
@@ -9,6 +9,7 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('search/', views.search, name='search'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path("posts/<int:post_id>/comment/", views.add_comment,
@@ -18,4 +19,6 @@ urlpatterns = [
          name="profile_follow"),
     path("profile/<str:username>/unfollow/", views.profile_unfollow,
          name="profile_unfollow"),
+    path("profile/<str:username>/export/", views.profile_export,
+         name="profile_export"),
 ]
@@ -1,20 +1,76 @@
 from django.shortcuts import redirect, render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.conf import settings
-from django.views.decorators.cache import cache_page
-from posts.forms import PostForm, CommentForm
-from posts.models import Group, Post, Follow
+from django.core.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
+from core.cache import cache_page_tagged, conditional_page
+from posts.export import FORMATS, export_stream
+from posts.forms import CommentForm, PostForm, SearchForm
+from posts.models import Group, Post, Follow, TimelineEntry
+from posts.paginators import (
+    COUNT_STRATEGIES, ApproximatePaginator, CursorPaginator,
+    ScoreCursorPaginator
+)
+from posts.search import highlight, search_posts
+from posts.stats import get_stats
+from posts.thumbnails import enqueue as enqueue_thumbnails
 from .models import Post, Group, User
 
 
-def paginate_page(request, posts_qs):
-    paginator = Paginator(posts_qs, settings.AMOUNT_OF_POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def paginate_page(request, posts_qs, keys=('pub_date', 'id')):
+    """Страница ленты: обычный ``Page`` или курсорная по запросу.
+
+    Без параметров и с ``?page=N`` отдаётся ``Page`` с номерами страниц;
+    ``?before=`` / ``?after=`` включают keyset-пагинацию, которой не
+    нужны ``COUNT(*)`` и ``OFFSET``.
+    """
+    before = request.GET.get('before')
+    after = request.GET.get('after')
+    if before is not None or after is not None:
+        paginator = CursorPaginator(
+            posts_qs, settings.AMOUNT_OF_POSTS_PER_PAGE, keys=keys
+        )
+        return paginator.get_cursor_page(before=before, after=after)
+    paginator = ApproximatePaginator(
+        posts_qs.order_by(f'-{keys[0]}', f'-{keys[1]}'),
+        settings.AMOUNT_OF_POSTS_PER_PAGE,
+        count_strategy=COUNT_STRATEGIES[settings.PAGINATOR_COUNT](),
+        max_pages=settings.PAGINATOR_MAX_PAGES,
+    )
+    return paginator.get_page(request.GET.get('page'))
+
+
+def index_tags(request):
+    return ['feed:index']
+
+
+def group_tags(request, slug):
+    return [f'group:{slug}']
+
+
+def profile_tags(request, username):
+    author_id = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    return [f'author:{author_id}']
 
 
-@cache_page(20, key_prefix='index_page')
+def follow_tags(request):
+    return [f'timeline:{request.user.pk}']
+
+
+def post_detail_tags(request, post_id):
+    author_id = Post.objects.filter(
+        pk=post_id
+    ).values_list('author_id', flat=True).first()
+    return [f'post:{post_id}', f'author:{author_id}']
+
+
+@conditional_page(index_tags)
+@cache_page_tagged(
+    settings.CACHE_PAGE_TIMEOUT, index_tags,
+    stale_timeout=settings.CACHE_PAGE_STALE_TIMEOUT,
+)
 def index(request):
     posts = Post.objects.select_related(
         'group', 'author')
@@ -25,6 +81,11 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(group_tags)
+@cache_page_tagged(
+    settings.CACHE_PAGE_TIMEOUT, group_tags,
+    stale_timeout=settings.CACHE_PAGE_STALE_TIMEOUT,
+)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related(
@@ -38,15 +99,17 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@conditional_page(profile_tags)
+@cache_page_tagged(
+    settings.CACHE_PAGE_TIMEOUT, profile_tags,
+    stale_timeout=settings.CACHE_PAGE_STALE_TIMEOUT,
+)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    paginator = Paginator(
-        author.posts.all(),
-        settings.NUMBER_POST
-    )
-    page_obj = paginator.get_page(
-        request.GET.get('page')
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
     )
+    posts = author.posts.select_related('group', 'author')
+    page_obj = paginate_page(request, posts)
     following = (
         request.user.is_authenticated
         and request.user != author
@@ -55,6 +118,7 @@ def profile(request, username):
     template = 'posts/profile.html'
     context = {
         'author': author,
+        'stats': get_stats(author),
         'username': username,
         'page_obj': page_obj,
         'following': following
@@ -62,30 +126,67 @@ def profile(request, username):
     return render(request, template, context)
 
 
+@conditional_page(post_detail_tags)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, id=post_id)
-    posts_count = post.author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    stats = get_stats(post.author)
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     context = {
         'post': post,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'form': form,
         'comments': comments
     }
     return render(request, template, context)
 
 
+def search(request):
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    if form.is_valid() and form.cleaned_data['q']:
+        group = form.cleaned_data['group']
+        posts = search_posts(
+            form.cleaned_data['q'],
+            group=group.slug if group else None,
+            author=form.cleaned_data['author'],
+        )
+        paginator = ScoreCursorPaginator(
+            posts, settings.AMOUNT_OF_POSTS_PER_PAGE
+        )
+        page_obj = paginator.get_cursor_page(
+            before=request.GET.get('before'),
+            after=request.GET.get('after'),
+        )
+        for post in page_obj:
+            post.highlighted = highlight(post.snippet)
+    query = request.GET.copy()
+    for key in ('before', 'after', 'page'):
+        query.pop(key, None)
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'page_query': f'{query.urlencode()}&' if query else '',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     template = 'posts/post_create.html'
     form = PostForm(request.POST or None,
-                    files=request.FILES or None)
+                    files=request.FILES or None,
+                    user=request.user,
+                    upload=request.POST.get('upload', ''))
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         form.save()
+        enqueue_thumbnails(post)
         return redirect('posts:profile', post.author)
     return render(request, template, {'form': form})
 
@@ -93,11 +194,13 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     template = 'posts/post_create.html'
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.select_related('author'), id=post_id)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        user=request.user,
+        upload=request.POST.get('upload', ''),
     )
     context = {
         'form': form,
@@ -106,9 +209,11 @@ def post_edit(request, post_id):
         'is_edit': True,
     }
     if request.user == post.author and form.is_valid():
-        post = form.save(commit=False)
-        post.author = request.user
-        post.save()
+        if form.image_changed:
+            post.image_placeholder = ''
+        post = form.save()
+        if form.image_changed:
+            enqueue_thumbnails(post)
         return redirect(f'/posts/{post.id}', id=post_id)
     return render(request, template, context)
 
@@ -126,9 +231,14 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional_page(follow_tags)
+@cache_page_tagged(settings.CACHE_PAGE_TIMEOUT, follow_tags)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginate_page(request, posts)
+    entries = TimelineEntry.objects.filter(
+        user=request.user
+    ).select_related('post__group', 'post__author')
+    page_obj = paginate_page(request, entries, keys=('pub_date', 'post_id'))
+    page_obj.object_list = [entry.post for entry in page_obj]
     context = {
         'page_obj': page_obj,
     }
@@ -155,3 +265,25 @@ def profile_unfollow(request, username):
     )
     follow.delete()
     return redirect('posts:profile', username)
+
+
+@login_required
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.user != author and not request.user.is_staff:
+        raise PermissionDenied
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        export_format = 'ndjson'
+    compress = request.GET.get('gzip') == '1'
+    filename = f'{author.username}.{export_format}'
+    content_type = FORMATS[export_format]
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+    response = StreamingHttpResponse(
+        export_stream(author, export_format, compress),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
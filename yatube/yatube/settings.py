@@ -32,10 +32,89 @@ NUMBER_POST = 10
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 200_000,
+            'MAX_SIZE': 512 * 1024 * 1024,
+        },
     }
 }
 
+# manage.py test берёт настройки тестов из yatube.settings_test.
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Страницы лент живут в кэше до инвалидации тегов (см. core.cache).
+CACHE_PAGE_TIMEOUT = 60 * 60
+
+# Сколько ещё секунд после CACHE_PAGE_TIMEOUT отдаётся устаревшая страница,
+# пока она обновляется в фоне.
+CACHE_PAGE_STALE_TIMEOUT = 60 * 10
+
+# Карточка поста в кэше привязана к версии содержимого и не устаревает.
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# Потоки, которые создают миниатюры после загрузки (posts.thumbnails);
+# 0 — создавать сразу в потоке запроса.
+THUMBNAIL_WORKERS = 2
+
+# Загруженные картинки проверяются и пережимаются в пуле процессов
+# (posts.ingest): не больше IMAGE_MAX_BYTES байт и IMAGE_MAX_PIXELS
+# пикселей, длинная сторона уменьшается до IMAGE_MAX_EDGE.
+# IMAGE_INGEST_WORKERS = 0 — обрабатывать в процессе запроса.
+IMAGE_INGEST_WORKERS = 2
+IMAGE_INGEST_TIMEOUT = 30
+IMAGE_MAX_BYTES = 20 * 2**20
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_MAX_EDGE = 2560
+
+# Загрузка картинок по частям (posts.uploads): части дописываются
+# в файл каталога CHUNKED_UPLOAD_DIR; незавершённые загрузки удаляются
+# через CHUNKED_UPLOAD_EXPIRY секунд.
+CHUNKED_UPLOAD_DIR = os.path.join(BASE_DIR, 'upload_chunks')
+CHUNKED_UPLOAD_CHUNK_SIZE = 2**20
+CHUNKED_UPLOAD_EXPIRY = 60 * 60 * 24
+
+# Счётчики воркеров для /metrics: каждый процесс сбрасывает свои в файл
+# каталога METRICS_DIR не чаще раза в METRICS_FLUSH_INTERVAL секунд.
+# Сборщик передаёт METRICS_TOKEN в заголовке Authorization: Bearer;
+# пока токен пустой, /metrics закрыт.
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 1
+METRICS_SERVER_TIMING = True
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Журнал N+1 и медленных запросов (core.middleware.QueryInspectorMiddleware)
+# пишется в queries.log; по умолчанию выключен.
+QUERY_INSPECTOR = False
+QUERY_INSPECTOR_REPEATS = 5
+QUERY_INSPECTOR_SLOW_MS = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {'format': '%(asctime)s %(levelname)s %(message)s'},
+    },
+    'handlers': {
+        'queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'queries.log'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'verbose',
+        },
+    },
+    'loggers': {
+        'yatube.queries': {
+            'handlers': ['queries'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -43,6 +122,8 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # Application definition
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryInspectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -109,12 +190,41 @@ USE_TZ = True
 
 AMOUNT_OF_POSTS_PER_PAGE = 10
 
+# Подсчёт объектов для постраничной навигации: exact, cached или estimated.
+PAGINATOR_COUNT = 'cached'
+
+# Глубже этой страницы ?page=N не уходит.
+PAGINATOR_MAX_PAGES = 500
+
+# Сколько последних записей хранится в материализованной ленте подписок.
+# Каждый новый пост обрезает ленты лишь одного из TIMELINE_TRIM_EVERY
+# подписчиков автора, так что лента бывает длиннее на столько же записей.
+TIMELINE_LENGTH = 1000
+TIMELINE_TRIM_EVERY = 100
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.1/howto/static-files/
 
 STATIC_URL = '/static/'
 
 STATIC_ROOT = 'yatube/static'
+
+# Без DEBUG имена статики содержат хэш содержимого (после collectstatic),
+# и её можно кэшировать навсегда.
+if not DEBUG:
+    STATICFILES_STORAGE = (
+        'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+    )
+
+# Медиа и статику отдаёт core.files.serve: ETag, Range и
+# Cache-Control: immutable для имён с хэшем. SENDFILE_BACKEND = 'nginx'
+# передаёт сами байты веб-серверу через X-Accel-Redirect на внутренний
+# location SENDFILE_URL ('/internal/media/…', '/internal/static/…'),
+# 'apache' — через X-Sendfile; None — файл читает Django. Файлы без
+# хэша в имени кэшируются на FILE_CACHE_MAX_AGE секунд.
+SENDFILE_BACKEND = None
+SENDFILE_URL = '/internal/'
+FILE_CACHE_MAX_AGE = 60 * 60
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -131,6 +241,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
     'debug_toolbar',
 ]
@@ -0,0 +1,35 @@
+"""Настройки тестов.
+
+Тесты чистят кэш (``cache.clear()``), поэтому не должны видеть файл кэша
+разработки: кэш живёт в памяти процесса. pytest берёт этот модуль из
+``pytest.ini``, ``manage.py test`` накладывает его через
+``core.test_runner.TestRunner``.
+"""
+import atexit
+import shutil
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    }
+}
+
+# Миниатюры создаются в потоке запроса: фоновые потоки пишут в тестовую
+# базу, пока её откатывают после теста.
+THUMBNAIL_WORKERS = 0
+
+# Каждый запрос тестового клиента проходит через middleware метрик:
+# файлы процессов пишутся во временный каталог, а не в рабочий.
+METRICS_DIR = tempfile.mkdtemp(prefix='yatube-metrics-')
+atexit.register(shutil.rmtree, METRICS_DIR, ignore_errors=True)
+
+# Настройки, которыми тесты отличаются от основных.
+OVERRIDES = {
+    'CACHES': CACHES,
+    'THUMBNAIL_WORKERS': THUMBNAIL_WORKERS,
+    'METRICS_DIR': METRICS_DIR,
+}